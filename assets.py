@@ -0,0 +1,162 @@
+#----------------------------------------------------------------------------#
+# Bundled, fingerprinted static assets.
+#
+# `flask assets build` concatenates and minifies (with rcssmin and rjsmin)
+# each bundle below into static/dist/<name>.<hash>.<ext>, next to .gz and
+# .br (brotli) copies, and records the file names in
+# static/dist/manifest.json. Templates call asset_urls('main.css'): with a
+# manifest that is the one hashed file, served from /static/dist with a
+# far-future immutable Cache-Control (a new build means new URLs); without
+# one, e.g. in development, it is the bundle's source files.
+#----------------------------------------------------------------------------#
+
+import gzip
+import hashlib
+import importlib.util
+import json
+import mimetypes
+import os
+import re
+
+from flask import current_app, request, send_from_directory, url_for, abort
+
+# bundle -> source files under static/, in load order
+BUNDLES = {
+  'main.css': (
+    'css/bootstrap.min.css',
+    'css/layout.main.css',
+    'css/main.css',
+    'css/main.responsive.css',
+    'css/main.quickfix.css',
+  ),
+  # run in <head>, before the page renders
+  'head.js': (
+    'js/libs/modernizr-2.8.2.min.js',
+    'js/libs/moment.min.js',
+  ),
+  # deferred, after jQuery
+  'main.js': (
+    'js/script.js',
+    'js/libs/bootstrap-3.1.1.min.js',
+    'js/plugins.js',
+  ),
+}
+DIST = 'dist'
+MANIFEST = 'manifest.json'
+# preferred first
+ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+
+# build() refuses to run without these rather than ship unminified or
+# uncompressed bundles
+BUILD_PACKAGES = ('rcssmin', 'rjsmin', 'brotli')
+
+
+def minify_css(text):
+  import rcssmin
+  return rcssmin.cssmin(text)
+
+
+def minify_js(text):
+  import rjsmin
+  return rjsmin.jsmin(text)
+
+
+def bundle_text(static_folder, sources, minify):
+  parts = []
+  for source in sources:
+    with open(os.path.join(static_folder, source), encoding='utf-8') as f:
+      parts.append(f.read())
+  if sources[0].endswith('.css'):
+    text = '\n'.join(parts)
+    return minify_css(text) if minify else text
+  # a file may end without a semicolon or inside a // comment
+  text = '\n;\n'.join(parts)
+  return minify_js(text) if minify else text
+
+
+def compress(path, data):
+  # Write the .gz and .br copies of `path`; returns their suffixes.
+  import brotli
+  with open(path + '.gz', 'wb') as f:
+    f.write(gzip.compress(data, compresslevel=9, mtime=0))
+  with open(path + '.br', 'wb') as f:
+    f.write(brotli.compress(data, quality=11))
+  return ['.gz', '.br']
+
+
+def build(static_folder, minify=True, clean=False):
+  # Write every bundle and the manifest; returns {bundle: (file, bytes, suffixes)}.
+  missing = [package for package in BUILD_PACKAGES if importlib.util.find_spec(package) is None]
+  if missing:
+    raise RuntimeError('building assets needs {0}; pip install -r requirements.txt'.format(', '.join(missing)))
+  dist = os.path.join(static_folder, DIST)
+  os.makedirs(dist, exist_ok=True)
+  manifest = {}
+  built = {}
+  for name, sources in sorted(BUNDLES.items()):
+    data = bundle_text(static_folder, sources, minify).encode('utf-8')
+    stem, ext = os.path.splitext(name)
+    filename = '{0}.{1}{2}'.format(stem, hashlib.sha256(data).hexdigest()[:12], ext)
+    path = os.path.join(dist, filename)
+    with open(path, 'wb') as f:
+      f.write(data)
+    built[name] = (filename, len(data), compress(path, data))
+    manifest[name] = filename
+  with open(os.path.join(dist, MANIFEST + '.tmp'), 'w') as f:
+    json.dump(manifest, f, indent=2, sort_keys=True)
+  os.replace(os.path.join(dist, MANIFEST + '.tmp'), os.path.join(dist, MANIFEST))
+  if clean:
+    # earlier builds; keep them while pages that link to them may be cached
+    current = set(manifest.values())
+    for filename in os.listdir(dist):
+      if filename != MANIFEST and re.sub(r'\.(gz|br)$', '', filename) not in current:
+        os.remove(os.path.join(dist, filename))
+  return built
+
+
+class Assets(object):
+
+  def __init__(self, app=None):
+    if app is not None:
+      self.init_app(app)
+
+  def init_app(self, app):
+    app.config.setdefault('ASSETS_MAX_AGE', 365 * 24 * 3600)
+    manifest = None
+    path = os.path.join(app.static_folder, DIST, MANIFEST)
+    if os.path.exists(path):
+      with open(path) as f:
+        manifest = json.load(f)
+    app.extensions['assets'] = {'manifest': manifest}
+    app.add_template_global(self.urls, 'asset_urls')
+    app.add_url_rule(app.static_url_path + '/' + DIST + '/<path:filename>', 'assets', self.send)
+
+  def urls(self, name):
+    # URLs to link for bundle `name`, in order.
+    manifest = current_app.extensions['assets']['manifest']
+    if manifest and name in manifest:
+      return [url_for('assets', filename=manifest[name])]
+    return [url_for('static', filename=source) for source in BUNDLES[name]]
+
+  def send(self, filename):
+    # Hashed names never change content, so clients may keep them for good;
+    # send the smallest precompressed copy the client accepts.
+    if filename == MANIFEST:
+      abort(404)
+    dist = os.path.join(current_app.static_folder, DIST)
+    max_age = current_app.config['ASSETS_MAX_AGE']
+    mimetype = mimetypes.guess_type(filename)[0]
+    for encoding, suffix in ENCODINGS:
+      if encoding in request.accept_encodings and os.path.isfile(os.path.join(dist, filename + suffix)):
+        response = send_from_directory(dist, filename + suffix, mimetype=mimetype, max_age=max_age)
+        response.content_encoding = encoding
+        break
+    else:
+      response = send_from_directory(dist, filename, mimetype=mimetype, max_age=max_age)
+    response.vary.add('Accept-Encoding')
+    response.cache_control.public = True
+    response.cache_control.immutable = True
+    return response
+
+
+assets = Assets()
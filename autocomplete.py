@@ -0,0 +1,225 @@
+#----------------------------------------------------------------------------#
+# In-process typeahead over venue and artist names.
+#
+# Each worker keeps a sorted array of every word-suffix of every name
+# ("the musical hop", "musical hop", "hop"), so a prefix lookup is a bisect
+# plus a short scan, and its top hits by upcoming show count are memoised
+# until the next change. The write handlers update the index in place and
+# publish each change to the 'autocomplete' cache feed; every
+# AUTOCOMPLETE_CHECK_SECONDS the other workers apply what was published
+# since they last looked (one GET on the shared backend; nothing reaches the
+# database). A worker reloads every name only in a background thread: when
+# it has missed more changes than the feed keeps, when `flask import` asks
+# for it, and after AUTOCOMPLETE_MAX_AGE so the counts used for ranking stay
+# fresh.
+#----------------------------------------------------------------------------#
+
+import heapq
+import re
+import threading
+import time
+from bisect import bisect_left, insort
+
+from flask import current_app
+
+from cache import cache
+from models import db, Venue, Artist
+
+WORD = re.compile(r'\w+')
+FEED = 'autocomplete'
+# changes the feed keeps for workers that haven't applied them yet
+FEED_KEEP = 1000
+# hits memoised per prefix; requests may ask for up to this many
+MAX_LIMIT = 20
+MAX_MEMO = 10000
+# prefixes matching more keys than this ("a", "th") walk the names in rank
+# order instead, where matches are dense enough to fill the top hits fast
+DENSE_PREFIX = 2000
+
+
+def normalize(text):
+  return ' '.join(WORD.findall(text.casefold()))
+
+
+class PrefixIndex(object):
+
+  def __init__(self):
+    self._keys = []     # sorted (suffix, kind, id)
+    self._entries = {}  # (kind, id) -> (name, num_upcoming_shows, suffixes)
+    self._ranked = []   # sorted (-num_upcoming_shows, name, kind, id)
+    self._memo = {}
+    self._lock = threading.Lock()
+
+  def __len__(self):
+    return len(self._entries)
+
+  def _suffixes(self, name):
+    words = normalize(name or '').split(' ')
+    return [' '.join(words[start:]) for start in range(len(words)) if words[start]]
+
+  def _remove(self, ref):
+    entry = self._entries.pop(ref, None)
+    if entry is not None:
+      for suffix in entry[2]:
+        del self._keys[bisect_left(self._keys, (suffix,) + ref)]
+      del self._ranked[bisect_left(self._ranked, self._rank(entry, ref))]
+
+  def _rank(self, entry, ref):
+    return (-entry[1], entry[0]) + ref
+
+  def add(self, kind, entity_id, name, num_upcoming_shows):
+    # Insert or replace one venue/artist.
+    ref = (kind, entity_id)
+    with self._lock:
+      self._remove(ref)
+      entry = self._entries[ref] = (name or '', num_upcoming_shows, self._suffixes(name))
+      for suffix in entry[2]:
+        insort(self._keys, (suffix,) + ref)
+      insort(self._ranked, self._rank(entry, ref))
+      self._memo.clear()
+
+  def remove(self, kind, entity_id):
+    with self._lock:
+      self._remove((kind, entity_id))
+      self._memo.clear()
+
+  def replace_all(self, rows):
+    # rows: (kind, id, name, num_upcoming_shows)
+    entries = {}
+    keys = []
+    for kind, entity_id, name, num_upcoming_shows in rows:
+      entry = entries[(kind, entity_id)] = (name or '', num_upcoming_shows, self._suffixes(name))
+      keys.extend((suffix, kind, entity_id) for suffix in entry[2])
+    keys.sort()
+    ranked = sorted(self._rank(entry, ref) for ref, entry in entries.items())
+    with self._lock:
+      self._keys, self._ranked, self._entries, self._memo = keys, ranked, entries, {}
+
+  def _top(self, prefix):
+    low = bisect_left(self._keys, (prefix,))
+    high = bisect_left(self._keys, (prefix + '\uffff',))
+    if high - low <= DENSE_PREFIX:
+      refs = set(key[1:] for key in self._keys[low:high])
+      ranked = heapq.nsmallest(MAX_LIMIT, (self._rank(self._entries[ref], ref) for ref in refs))
+      return [rank[2:] for rank in ranked]
+    top = []
+    for rank in self._ranked:
+      ref = rank[2:]
+      if any(suffix.startswith(prefix) for suffix in self._entries[ref][2]):
+        top.append(ref)
+        if len(top) == MAX_LIMIT:
+          break
+    return top
+
+  def search(self, text, limit):
+    prefix = normalize(text)
+    if not prefix:
+      return []
+    with self._lock:
+      hits = self._memo.get(prefix)
+      if hits is None:
+        hits = [ref + self._entries[ref][:2] for ref in self._top(prefix)]
+        if len(self._memo) >= MAX_MEMO:
+          self._memo.clear()
+        self._memo[prefix] = hits
+    return hits[:limit]
+
+
+class Autocomplete(object):
+
+  def __init__(self, app=None):
+    if app is not None:
+      self.init_app(app)
+
+  def init_app(self, app):
+    app.config.setdefault('AUTOCOMPLETE_LIMIT', 10)
+    app.config.setdefault('AUTOCOMPLETE_CHECK_SECONDS', 1)
+    app.config.setdefault('AUTOCOMPLETE_MAX_AGE', 900)
+    app.extensions['autocomplete'] = {
+      # seq: the last feed message the index reflects; None until built
+      'index': PrefixIndex(), 'seq': None, 'built': 0, 'checked': 0,
+      'rebuilding': False, 'lock': threading.Lock(),
+    }
+
+  @property
+  def state(self):
+    return current_app.extensions['autocomplete']
+
+  def build(self):
+    # Load every venue and artist name; call at worker start (see
+    # gunicorn.conf.py), otherwise the first lookup does it. Changes
+    # published while it loads are applied again by the next check.
+    state = self.state
+    seq = cache.messages(FEED, None)[0]
+    rows = [('venue',) + tuple(row) for row in db.session.query(Venue.id, Venue.name, Venue.upcoming_shows_count)]
+    rows += [('artist',) + tuple(row) for row in db.session.query(Artist.id, Artist.name, Artist.upcoming_shows_count)]
+    state['index'].replace_all(rows)
+    state['seq'] = seq
+    state['built'] = state['checked'] = time.time()
+
+  def _build_in_background(self, app):
+    with app.app_context():
+      try:
+        self.build()
+      except Exception:
+        app.logger.exception('autocomplete rebuild failed')
+      finally:
+        db.session.remove()
+        app.extensions['autocomplete']['rebuilding'] = False
+
+  def _rebuild(self):
+    # Reload off the request path; lookups use the current index meanwhile.
+    state = self.state
+    with state['lock']:
+      if state['rebuilding']:
+        return
+      state['rebuilding'] = True
+    threading.Thread(target=self._build_in_background, args=(current_app._get_current_object(),),
+                     daemon=True).start()
+
+  def _refresh(self):
+    state = self.state
+    if state['seq'] is None:
+      self.build()
+      return
+    now = time.time()
+    if now - state['checked'] < current_app.config['AUTOCOMPLETE_CHECK_SECONDS']:
+      return
+    state['checked'] = now
+    if state['rebuilding']:
+      # the rebuild sets seq to where its rows were read from
+      return
+    seq, messages = cache.messages(FEED, state['seq'])
+    if messages is None or now - state['built'] >= current_app.config['AUTOCOMPLETE_MAX_AGE']:
+      self._rebuild()
+      return
+    for message in messages:
+      if message[0] == 'reload':
+        self._rebuild()
+        return
+      getattr(state['index'], message[0])(*message[1:])
+    state['seq'] = seq
+
+  def search(self, text, limit):
+    self._refresh()
+    return self.state['index'].search(text, min(limit, MAX_LIMIT))
+
+  def _publish(self, message):
+    # this worker applies its own messages again at its next check, which
+    # changes nothing
+    cache.publish(FEED, message, FEED_KEEP)
+
+  def add(self, kind, entity_id, name, num_upcoming_shows=0):
+    self.state['index'].add(kind, entity_id, name, num_upcoming_shows)
+    self._publish(['add', kind, entity_id, name, num_upcoming_shows])
+
+  def remove(self, kind, entity_id):
+    self.state['index'].remove(kind, entity_id)
+    self._publish(['remove', kind, entity_id])
+
+  def reload(self):
+    # Make every worker reload all names, e.g. after a bulk import.
+    self._publish(['reload'])
+
+
+autocomplete = Autocomplete()
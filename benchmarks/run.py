@@ -0,0 +1,304 @@
+"""Drive every route in views.py through the Flask test client and report
+p50/p95 latency, queries per request and peak memory per route.
+
+  $ python -m benchmarks.seed --truncate
+  $ python -m benchmarks.run --requests 50 --output bench/before.json
+  $ python -m benchmarks.run --requests 50 --output bench/after.json --baseline bench/before.json
+
+The response cache is disabled unless --cache is given, so the numbers
+measure the database and template path. Write routes create, edit and
+delete their own rows and leave the seeded data alone.
+
+Exits non-zero when a route issues more queries than its QUERY_BUDGETS
+entry in config.py, so CI can run it against a small seed.
+"""
+import argparse
+import json
+import random
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+from sqlalchemy import event
+
+from app import create_app
+from models import db, Venue, Artist, DEFAULT_SHOW_MINUTES
+
+
+class Route(object):
+
+  def __init__(self, name, endpoint, method, url, data=None, json=None):
+    self.name = name
+    self.endpoint = endpoint
+    self.method = method
+    self.url = url
+    self.data = data or (lambda ctx: None)
+    # JSON request bodies (the batch routes), instead of form data
+    self.json = json or (lambda ctx: None)
+
+
+def bench_form(kind, serial):
+  return {
+    'name': 'Bench {0} {1}'.format(kind, serial),
+    'city': 'San Francisco',
+    'state': 'CA',
+    'address': '1 Bench St',
+    'phone': '415-000-0000',
+    'genres': 'Jazz',
+    'facebook_link': 'https://www.facebook.com/bench',
+  }
+
+
+def latest_id(model, prefix):
+  return db.session.query(db.func.max(model.id)).filter(model.name.like(prefix + '%')).scalar()
+
+
+def latest_ids(model, prefix, count):
+  return [row.id for row in db.session.query(model.id).filter(
+    model.name.like(prefix + '%')).order_by(model.id.desc()).limit(count)]
+
+
+def bench_rows(model, kind, serial, count):
+  # rows for a batch delete to remove, inserted before the measured window
+  rows = [model(name='Bench Batch {0} {1}-{2}'.format(kind, serial, number), city='San Francisco',
+                state='CA', genres=['Jazz']) for number in range(count)]
+  db.session.add_all(rows)
+  db.session.commit()
+  return [row.id for row in rows]
+
+
+# rows per batch PATCH/DELETE request
+BATCH_ROWS = 10
+
+
+ROUTES = [
+  Route('index', 'main.index', 'GET', lambda ctx: '/'),
+  Route('venues', 'main.venues', 'GET', lambda ctx: '/venues'),
+  Route('venues?genre=Jazz', 'main.venues', 'GET', lambda ctx: '/venues?genre=Jazz'),
+  Route('search_venues', 'main.search_venues', 'POST', lambda ctx: '/venues/search',
+        lambda ctx: {'search_term': ctx['term']}),
+  Route('autocomplete', 'main.autocomplete_names', 'GET', lambda ctx: '/autocomplete?q={0}'.format(ctx['term'][:3])),
+  Route('search', 'main.search', 'GET', lambda ctx: '/search?q={0}'.format(ctx['term'])),
+  Route('show_venue', 'main.show_venue', 'GET', lambda ctx: '/venues/{0}'.format(ctx['rng'].choice(ctx['venue_ids']))),
+  Route('venue_calendar', 'main.venue_calendar', 'GET',
+        lambda ctx: '/venues/{0}/calendar'.format(ctx['rng'].choice(ctx['venue_ids']))),
+  Route('artists', 'main.artists', 'GET', lambda ctx: '/artists'),
+  Route('artists?genre=Jazz', 'main.artists', 'GET', lambda ctx: '/artists?genre=Jazz'),
+  Route('search_artists', 'main.search_artists', 'POST', lambda ctx: '/artists/search',
+        lambda ctx: {'search_term': ctx['term']}),
+  Route('show_artist', 'main.show_artist', 'GET', lambda ctx: '/artists/{0}'.format(ctx['rng'].choice(ctx['artist_ids']))),
+  Route('shows', 'main.shows', 'GET', lambda ctx: '/shows'),
+  Route('shows?when=upcoming', 'main.shows', 'GET', lambda ctx: '/shows?when=upcoming'),
+  Route('shows?genre=Jazz', 'main.shows', 'GET', lambda ctx: '/shows?genre=Jazz'),
+  Route('export_shows.csv', 'main.export_shows', 'GET',
+        lambda ctx: '/shows/export.csv?venue_id={0}'.format(ctx['rng'].choice(ctx['venue_ids']))),
+  Route('edit_venue', 'main.edit_venue', 'GET', lambda ctx: '/venues/{0}/edit'.format(ctx['rng'].choice(ctx['venue_ids']))),
+  Route('edit_artist', 'main.edit_artist', 'GET', lambda ctx: '/artists/{0}/edit'.format(ctx['rng'].choice(ctx['artist_ids']))),
+  Route('create_venue_form', 'main.create_venue_form', 'GET', lambda ctx: '/venues/create'),
+  Route('create_artist_form', 'main.create_artist_form', 'GET', lambda ctx: '/artists/create'),
+  Route('create_shows', 'main.create_shows', 'GET', lambda ctx: '/shows/create'),
+  Route('metrics', 'metrics', 'GET', lambda ctx: '/_metrics'),
+]
+
+WRITE_ROUTES = [
+  Route('create_venue_submission', 'main.create_venue_submission', 'POST', lambda ctx: '/venues/create',
+        lambda ctx: bench_form('Venue', ctx['serial'])),
+  Route('create_artist_submission', 'main.create_artist_submission', 'POST', lambda ctx: '/artists/create',
+        lambda ctx: bench_form('Artist', ctx['serial'])),
+  Route('create_show_submission', 'main.create_show_submission', 'POST', lambda ctx: '/shows/create',
+        lambda ctx: {
+          'venue_id': latest_id(Venue, 'Bench Venue'),
+          'artist_id': latest_id(Artist, 'Bench Artist'),
+          # far enough apart not to overlap, so every request inserts
+          'start_time': (datetime(2100, 1, 1) + timedelta(minutes=2 * DEFAULT_SHOW_MINUTES * ctx['serial'])
+                         ).strftime('%Y-%m-%d %H:%M:%S'),
+        }),
+  Route('edit_venue_submission', 'main.edit_venue_submission', 'POST',
+        lambda ctx: '/venues/{0}/edit'.format(latest_id(Venue, 'Bench Venue')),
+        lambda ctx: bench_form('Venue', ctx['serial'])),
+  Route('edit_artist_submission', 'main.edit_artist_submission', 'POST',
+        lambda ctx: '/artists/{0}/edit'.format(latest_id(Artist, 'Bench Artist')),
+        lambda ctx: bench_form('Artist', ctx['serial'])),
+  Route('edit_venues', 'main.edit_venues', 'PATCH', lambda ctx: '/venues',
+        json=lambda ctx: [{'id': venue_id, 'phone': '415-000-{0:04d}'.format(ctx['serial']), 'genres': ['Jazz', 'Blues']}
+                          for venue_id in latest_ids(Venue, 'Bench Venue', BATCH_ROWS)]),
+  Route('edit_artists', 'main.edit_artists', 'PATCH', lambda ctx: '/artists',
+        json=lambda ctx: [{'id': artist_id, 'phone': '415-000-{0:04d}'.format(ctx['serial']), 'genres': ['Jazz', 'Blues']}
+                          for artist_id in latest_ids(Artist, 'Bench Artist', BATCH_ROWS)]),
+  Route('delete_venues', 'main.delete_venues', 'DELETE', lambda ctx: '/venues',
+        json=lambda ctx: bench_rows(Venue, 'Venue', ctx['serial'], BATCH_ROWS)),
+  Route('delete_artists', 'main.delete_artists', 'DELETE', lambda ctx: '/artists',
+        json=lambda ctx: bench_rows(Artist, 'Artist', ctx['serial'], BATCH_ROWS)),
+  Route('delete_venue', 'main.delete_venue', 'DELETE',
+        lambda ctx: '/venues/{0}'.format(latest_id(Venue, 'Bench Venue'))),
+]
+
+
+class QueryCounter(object):
+
+  def __init__(self, engine):
+    self.count = 0
+    event.listen(engine, 'before_cursor_execute', self._on_execute)
+
+  def _on_execute(self, conn, cursor, statement, parameters, context, executemany):
+    self.count += 1
+
+
+def percentile(samples, fraction):
+  ordered = sorted(samples)
+  return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+
+
+def run_route(app, client, route, ctx, requests, counter):
+  timings = []
+  queries = []
+  statuses = set()
+  peak = 0
+  for serial in range(requests):
+    ctx['serial'] = serial
+    # build the URL and payload outside the measured window
+    with app.app_context():
+      url = route.url(ctx)
+      body = {'data': route.data(ctx), 'json': route.json(ctx)}
+    # the first request warms template and statement caches; the second is
+    # traced for peak memory only, since tracing slows everything else
+    warmup, trace = serial == 0, serial == 1
+    if trace:
+      tracemalloc.start()
+    counter.count = 0
+    started = time.perf_counter()
+    response = client.open(url, method=route.method, **dict((key, value) for key, value in body.items() if value is not None))
+    # drain streamed bodies inside the measured window
+    response.get_data()
+    elapsed = time.perf_counter() - started
+    if trace:
+      peak = tracemalloc.get_traced_memory()[1]
+      tracemalloc.stop()
+    elif not warmup:
+      timings.append(elapsed)
+      queries.append(counter.count)
+    statuses.add(response.status_code)
+  return {
+    'requests': len(timings),
+    'statuses': sorted(statuses),
+    'p50_ms': round(percentile(timings, 0.50) * 1000, 3),
+    'p95_ms': round(percentile(timings, 0.95) * 1000, 3),
+    'mean_ms': round(statistics.mean(timings) * 1000, 3),
+    'queries_per_request': round(statistics.mean(queries), 2),
+    'max_queries': max(queries),
+    'peak_memory_kb': round(peak / 1024, 1),
+  }
+
+
+def git_revision():
+  try:
+    return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD']).decode().strip()
+  except (OSError, subprocess.CalledProcessError):
+    return None
+
+
+def compare(results, baseline_path):
+  with open(baseline_path) as f:
+    baseline = json.load(f)['routes']
+  print('\n{0:<28} {1:>10} {2:>10} {3:>8}'.format('route', 'p50 before', 'p50 after', 'ratio'))
+  for name, result in results.items():
+    if name in baseline:
+      before = baseline[name]['p50_ms']
+      print('{0:<28} {1:>10.2f} {2:>10.2f} {3:>8.2f}'.format(name, before, result['p50_ms'], result['p50_ms'] / max(before, 1e-9)))
+
+
+def check_budgets(app, routes, results, cache):
+  # With the cache on, hits issue fewer queries, so only uncached runs count.
+  if cache:
+    return []
+  over_budget = []
+  budgets = app.config['QUERY_BUDGETS']
+  for route in routes:
+    budget = budgets.get(route.endpoint)
+    if budget is not None and results[route.name]['max_queries'] > budget:
+      over_budget.append(route.name)
+      print('over budget: {0} issued {1} queries, budget {2}'.format(
+        route.name, results[route.name]['max_queries'], budget))
+  return over_budget
+
+
+def main():
+  parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+  parser.add_argument('--requests', type=int, default=20, help='requests per route, after one warm-up and one memory probe')
+  parser.add_argument('--routes', nargs='*', help='only run these route names')
+  parser.add_argument('--no-writes', dest='writes', action='store_false', help='skip the create/edit/delete routes')
+  parser.add_argument('--cache', action='store_true', help='leave the response cache enabled')
+  parser.add_argument('--term', default='the', help='search term for the search routes')
+  parser.add_argument('--seed', type=int, default=7)
+  parser.add_argument('--output', default='bench_results.json')
+  parser.add_argument('--baseline', help='earlier results JSON to compare p50 against')
+  args = parser.parse_args()
+
+  app = create_app({
+    'WTF_CSRF_ENABLED': False,
+    'CACHE_ENABLED': args.cache,
+    # budgets are checked below from the measured counts, across all requests
+    'QUERY_GUARD': 'off',
+    'SECRET_KEY': 'bench',
+  })
+  routes = ROUTES + (WRITE_ROUTES if args.writes else [])
+  if args.routes:
+    routes = [route for route in routes if route.name in args.routes]
+
+  covered = set(route.endpoint for route in ROUTES + WRITE_ROUTES)
+  missing = sorted(rule.endpoint for rule in app.url_map.iter_rules()
+                   if rule.endpoint not in covered and rule.endpoint not in ('static', 'assets'))
+  if missing:
+    print('warning: routes without a benchmark: {0}'.format(', '.join(missing)))
+
+  with app.app_context():
+    counter = QueryCounter(db.engine)
+    rng = random.Random(args.seed)
+    ctx = {
+      'rng': rng,
+      'term': args.term,
+      'venue_ids': [row.id for row in db.session.query(Venue.id).order_by(db.func.random()).limit(500)],
+      'artist_ids': [row.id for row in db.session.query(Artist.id).order_by(db.func.random()).limit(500)],
+    }
+    db.session.remove()
+
+  client = app.test_client()
+  results = {}
+  for route in routes:
+    results[route.name] = run_route(app, client, route, ctx, args.requests + 2, counter)
+    result = results[route.name]
+    print('{0:<28} p50 {1:>9.2f}ms  p95 {2:>9.2f}ms  {3:>6.1f} queries  {4:>9.1f} KiB peak  {5}'.format(
+      route.name, result['p50_ms'], result['p95_ms'], result['queries_per_request'],
+      result['peak_memory_kb'], result['statuses']))
+
+  with app.app_context():
+    totals = {
+      'venues': db.session.query(db.func.count(Venue.id)).scalar(),
+      'artists': db.session.query(db.func.count(Artist.id)).scalar(),
+    }
+  report = {
+    'meta': {
+      'timestamp': datetime.utcnow().isoformat(),
+      'git_revision': git_revision(),
+      'requests_per_route': args.requests,
+      'cache': args.cache,
+      'rows': totals,
+    },
+    'routes': results,
+  }
+  with open(args.output, 'w') as f:
+    json.dump(report, f, indent=2, sort_keys=True)
+  print('wrote {0}'.format(args.output))
+  if args.baseline:
+    compare(results, args.baseline)
+
+  over_budget = check_budgets(app, routes, results, args.cache)
+  if over_budget:
+    sys.exit(1)
+
+
+if __name__ == '__main__':
+  main()
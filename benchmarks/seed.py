@@ -0,0 +1,182 @@
+"""Fill the database with synthetic venues, artists and shows.
+
+  $ python -m benchmarks.seed --venues 10000 --artists 50000 --shows 1000000
+
+Cities are drawn weighted by population and genres by popularity, so the
+/venues grouping and the search pages see realistic skew. Rows are inserted
+with batched executemany; run it against a scratch database, as --truncate
+wipes the three tables first.
+"""
+import argparse
+import random
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy.dialects.postgresql import insert
+
+from app import create_app
+from models import db, Venue, Artist, Show, refresh_show_counters
+
+# (city, state, relative weight ~ metro population in millions)
+CITIES = [
+  ('New York', 'NY', 19.2), ('Los Angeles', 'CA', 13.2), ('Chicago', 'IL', 9.5),
+  ('Dallas', 'TX', 7.6), ('Houston', 'TX', 7.1), ('Washington', 'DC', 6.3),
+  ('Miami', 'FL', 6.1), ('Philadelphia', 'PA', 6.1), ('Atlanta', 'GA', 6.0),
+  ('Phoenix', 'AZ', 4.9), ('Boston', 'MA', 4.9), ('San Francisco', 'CA', 4.7),
+  ('Seattle', 'WA', 4.0), ('Minneapolis', 'MN', 3.6), ('San Diego', 'CA', 3.3),
+  ('Denver', 'CO', 3.0), ('Baltimore', 'MD', 2.8), ('St. Louis', 'MO', 2.8),
+  ('Portland', 'OR', 2.5), ('Charlotte', 'NC', 2.6), ('Austin', 'TX', 2.3),
+  ('Nashville', 'TN', 2.0), ('New Orleans', 'LA', 1.3), ('Memphis', 'TN', 1.3),
+  ('Salt Lake City', 'UT', 1.2), ('Louisville', 'KY', 1.3), ('Richmond', 'VA', 1.3),
+  ('Burlington', 'VT', 0.2), ('Missoula', 'MT', 0.1), ('Boise', 'ID', 0.8),
+]
+
+# (genre, relative weight)
+GENRES = [
+  ('Rock n Roll', 18), ('Pop', 16), ('Hip-Hop', 14), ('Country', 9), ('R&B', 8),
+  ('Electronic', 8), ('Jazz', 6), ('Alternative', 6), ('Folk', 4), ('Blues', 3),
+  ('Punk', 3), ('Heavy Metal', 3), ('Soul', 3), ('Reggae', 2), ('Classical', 2),
+  ('Funk', 2), ('Instrumental', 1), ('Musical Theatre', 1), ('Other', 1),
+]
+
+VENUE_WORDS = ['The', 'Blue', 'Musical', 'Hop', 'Park', 'Square', 'Live', 'Music', 'Coffee',
+               'Hall', 'Room', 'Lounge', 'Garden', 'Dueling', 'Pianos', 'Bar', 'Theatre',
+               'Warehouse', 'Cellar', 'Tavern', 'Arena', 'Den', 'Social', 'Club']
+ARTIST_WORDS = ['Guns', 'Petals', 'Matt', 'Quevedo', 'Wild', 'Sax', 'Band', 'The', 'Night',
+                'Owls', 'Velvet', 'Echo', 'Static', 'Lights', 'Sister', 'Brothers', 'Kid',
+                'Atlas', 'Neon', 'River', 'Ghost', 'Harbor', 'Saints', 'Quartet']
+
+
+def pick_name(rng, words, serial):
+  return '{0} {1} {2}'.format(rng.choice(words), rng.choice(words), serial)
+
+
+def pick_phone(rng):
+  return '{0:03d}-{1:03d}-{2:04d}'.format(rng.randint(200, 999), rng.randint(200, 999), rng.randint(0, 9999))
+
+
+def pick_genres(rng, genres, weights):
+  # one to three distinct genres, weighted by popularity
+  picks = rng.choices(genres, weights, k=rng.randint(1, 3))
+  return sorted(set(picks), key=picks.index)
+
+
+def batches(rows, size):
+  batch = []
+  for row in rows:
+    batch.append(row)
+    if len(batch) == size:
+      yield batch
+      batch = []
+  if batch:
+    yield batch
+
+
+def venue_rows(rng, count):
+  cities = [(city, state) for city, state, _ in CITIES]
+  weights = [weight for _, _, weight in CITIES]
+  genres = [genre for genre, _ in GENRES]
+  genre_weights = [weight for _, weight in GENRES]
+  for serial in range(count):
+    city, state = rng.choices(cities, weights)[0]
+    yield {
+      'name': pick_name(rng, VENUE_WORDS, serial),
+      'city': city,
+      'state': state,
+      'address': '{0} {1} St'.format(rng.randint(1, 9999), rng.choice(VENUE_WORDS)),
+      'phone': pick_phone(rng),
+      'genres': pick_genres(rng, genres, genre_weights),
+      'facebook_link': 'https://www.facebook.com/venue{0}'.format(serial),
+    }
+
+
+def artist_rows(rng, count):
+  cities = [(city, state) for city, state, _ in CITIES]
+  weights = [weight for _, _, weight in CITIES]
+  genres = [genre for genre, _ in GENRES]
+  genre_weights = [weight for _, weight in GENRES]
+  for serial in range(count):
+    city, state = rng.choices(cities, weights)[0]
+    yield {
+      'name': pick_name(rng, ARTIST_WORDS, serial),
+      'city': city,
+      'state': state,
+      'phone': pick_phone(rng),
+      'genres': pick_genres(rng, genres, genre_weights),
+      'facebook_link': 'https://www.facebook.com/artist{0}'.format(serial),
+    }
+
+
+def pick_skewed(rng, ids):
+  # 30% of picks follow a Pareto tail over the first ids, so a few hot venues
+  # and artists carry far more shows than the rest.
+  if rng.random() < 0.3:
+    return ids[min(int(rng.paretovariate(1.2)) - 1, len(ids) - 1)]
+  return ids[rng.randrange(len(ids))]
+
+
+def show_rows(rng, count, venue_ids, artist_ids, past_days, future_days):
+  now = datetime.utcnow().replace(second=0, microsecond=0)
+  for _ in range(count):
+    venue = pick_skewed(rng, venue_ids)
+    artist = pick_skewed(rng, artist_ids)
+    minutes = rng.randint(-past_days * 24 * 60, future_days * 24 * 60)
+    yield {
+      'venue_id': venue,
+      'artist_id': artist,
+      'start_time': now + timedelta(minutes=minutes - minutes % 30),
+      'duration_minutes': rng.choice((60, 90, 120, 180)),
+    }
+
+
+def load(statement, rows, batch_size, label):
+  started = time.perf_counter()
+  total = 0
+  for batch in batches(rows, batch_size):
+    db.session.execute(statement, batch)
+    db.session.commit()
+    total += len(batch)
+  elapsed = time.perf_counter() - started
+  print('{0}: {1} rows in {2:.1f}s ({3:.0f} rows/s)'.format(label, total, elapsed, total / max(elapsed, 1e-9)))
+
+
+def main():
+  parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+  parser.add_argument('--venues', type=int, default=10000)
+  parser.add_argument('--artists', type=int, default=50000)
+  parser.add_argument('--shows', type=int, default=1000000)
+  parser.add_argument('--past-days', type=int, default=3 * 365)
+  parser.add_argument('--future-days', type=int, default=365)
+  parser.add_argument('--batch-size', type=int, default=5000)
+  parser.add_argument('--seed', type=int, default=42)
+  parser.add_argument('--truncate', action='store_true', help='empty shows, venue and artist first')
+  args = parser.parse_args()
+  rng = random.Random(args.seed)
+
+  # no sessions are signed here, so any SECRET_KEY will do
+  app = create_app({'SECRET_KEY': 'seed'})
+  with app.app_context():
+    if args.truncate:
+      db.session.execute(db.text('TRUNCATE shows, venue, artist RESTART IDENTITY'))
+      db.session.commit()
+
+    load(Venue.__table__.insert(), venue_rows(rng, args.venues), args.batch_size, 'venues')
+    load(Artist.__table__.insert(), artist_rows(rng, args.artists), args.batch_size, 'artists')
+    venue_ids = [row.id for row in db.session.query(Venue.id).order_by(Venue.id)]
+    artist_ids = [row.id for row in db.session.query(Artist.id).order_by(Artist.id)]
+    # random picks can repeat a (venue, artist, start_time) key or overlap an
+    # earlier booking of the venue or artist; keep the first
+    load(insert(Show.__table__).on_conflict_do_nothing(),
+         show_rows(rng, args.shows, venue_ids, artist_ids, args.past_days, args.future_days),
+         args.batch_size, 'shows')
+
+    currentTime = datetime.utcnow()
+    refresh_show_counters(Venue, Show.venue_id, currentTime)
+    refresh_show_counters(Artist, Show.artist_id, currentTime)
+    db.session.execute(db.text('ANALYZE shows, venue, artist'))
+    db.session.commit()
+    print('show counters rebuilt and tables analyzed')
+
+
+if __name__ == '__main__':
+  main()
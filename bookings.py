@@ -0,0 +1,110 @@
+#----------------------------------------------------------------------------#
+# In-process interval index of venue bookings, behind /venues/<id>/calendar.
+#
+# Each worker keeps, for its most recently asked-for venues, the venue's
+# shows from today to CALENDAR_MAX_DAYS ahead sorted by start, with a
+# running maximum of their end times: the shows overlapping any window are
+# then one bisect on each list away, even where imported rows overlap. An
+# entry is reloaded (one indexed range query) when the venue's 'venue:<id>'
+# cache scope moves, which the booking form, `flask import shows` and the
+# partition commands bump, or when the day changes; across workers that
+# needs the shared cache backend (see config.py).
+#----------------------------------------------------------------------------#
+
+import threading
+from bisect import bisect_left, bisect_right
+from collections import OrderedDict
+from datetime import timedelta
+
+from flask import current_app
+
+from cache import cache
+from models import db, Venue, Show, MAX_SHOW_MINUTES, show_end
+
+
+class IntervalIndex(object):
+
+  def __init__(self, rows):
+    # rows: (start_time, end_time, artist_id), sorted by start_time
+    self._rows = rows
+    self._starts = [row[0] for row in rows]
+    self._max_ends = []
+    latest = None
+    for row in rows:
+      latest = row[1] if latest is None or row[1] > latest else latest
+      self._max_ends.append(latest)
+
+  def __len__(self):
+    return len(self._rows)
+
+  def overlapping(self, low, high):
+    # Rows with start < high and end > low, in start order. Rows before the
+    # first whose running max end passes `low` all end by `low`.
+    first = bisect_right(self._max_ends, low)
+    last = bisect_left(self._starts, high)
+    return [row for row in self._rows[first:last] if row[1] > low]
+
+
+def free_slots(busy, low, high):
+  # The gaps in [low, high) not covered by any (start, end, ...) in `busy`.
+  free = []
+  cursor = low
+  for row in busy:
+    if row[0] > cursor:
+      free.append((cursor, min(row[0], high)))
+    cursor = max(cursor, row[1])
+    if cursor >= high:
+      break
+  if cursor < high:
+    free.append((cursor, high))
+  return free
+
+
+class Bookings(object):
+
+  def __init__(self, app=None):
+    if app is not None:
+      self.init_app(app)
+
+  def init_app(self, app):
+    app.config.setdefault('CALENDAR_MAX_VENUES', 1024)
+    app.config.setdefault('CALENDAR_MAX_DAYS', 92)
+    app.extensions['bookings'] = {'venues': OrderedDict(), 'lock': threading.Lock()}
+
+  @property
+  def state(self):
+    return current_app.extensions['bookings']
+
+  def _load(self, venue_id, since):
+    # None when the venue does not exist
+    until = since + timedelta(days=current_app.config['CALENDAR_MAX_DAYS'])
+    rows = db.session.query(Show.start_time, Show.duration_minutes, Show.artist_id).filter(
+      Show.venue_id == venue_id,
+      Show.start_time > since - timedelta(minutes=MAX_SHOW_MINUTES),
+      Show.start_time < until).order_by(Show.start_time).all()
+    if not rows and db.session.query(Venue.id).filter(Venue.id == venue_id).scalar() is None:
+      return None
+    return IntervalIndex([(start_time, show_end(start_time, duration_minutes), artist_id)
+                          for start_time, duration_minutes, artist_id in rows])
+
+  def index(self, venue_id, today):
+    # The venue's IntervalIndex from `today` to CALENDAR_MAX_DAYS ahead, or
+    # None if there's no venue.
+    state = self.state
+    versions = cache.backend.versions(['venue:{0}'.format(venue_id)])
+    with state['lock']:
+      entry = state['venues'].get(venue_id)
+      if entry is not None and entry[0] == versions and entry[1] == today:
+        state['venues'].move_to_end(venue_id)
+        return entry[2]
+    index = self._load(venue_id, today)
+    if index is not None:
+      with state['lock']:
+        state['venues'][venue_id] = (versions, today, index)
+        state['venues'].move_to_end(venue_id)
+        while len(state['venues']) > current_app.config['CALENDAR_MAX_VENUES']:
+          state['venues'].popitem(last=False)
+    return index
+
+
+bookings = Bookings()
@@ -0,0 +1,247 @@
+#----------------------------------------------------------------------------#
+# Versioned response and fragment cache.
+#
+# Every cached page or fragment is keyed by its route, its arguments and the
+# current version of each "scope" it depends on (e.g. 'venues',
+# 'venue:12'). Write handlers bump the scopes they affect, which changes the
+# key so stale entries are never read again and simply age out via LRU/TTL.
+# Backends also keep short numbered message feeds, for in-process indexes
+# that apply each other process's changes instead of reloading.
+#----------------------------------------------------------------------------#
+
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict, deque
+from functools import wraps
+
+from flask import current_app, g, request, session, make_response
+
+
+class MemoryBackend(object):
+  # In-process LRU with per-entry TTL. Versions live in a separate dict that is
+  # never evicted, so a scope's version can't reset and resurrect old keys.
+
+  def __init__(self, max_entries=1024):
+    self.max_entries = max_entries
+    self._entries = OrderedDict()
+    self._versions = {}
+    self._feeds = {}
+    self._lock = threading.Lock()
+
+  def get(self, key):
+    with self._lock:
+      entry = self._entries.get(key)
+      if entry is None:
+        return None
+      expires, value = entry
+      if expires < time.time():
+        del self._entries[key]
+        return None
+      self._entries.move_to_end(key)
+      return value
+
+  def set(self, key, value, ttl):
+    with self._lock:
+      self._entries[key] = (time.time() + ttl, value)
+      self._entries.move_to_end(key)
+      while len(self._entries) > self.max_entries:
+        self._entries.popitem(last=False)
+
+  def versions(self, scopes):
+    with self._lock:
+      return [self._versions.get(scope, 0) for scope in scopes]
+
+  def bump(self, scopes):
+    with self._lock:
+      for scope in scopes:
+        self._versions[scope] = self._versions.get(scope, 0) + 1
+
+  def publish(self, feed, message, keep):
+    with self._lock:
+      seq, messages = self._feeds.get(feed, (0, None))
+      if messages is None:
+        messages = deque(maxlen=keep)
+      messages.append(message)
+      self._feeds[feed] = (seq + 1, messages)
+
+  def messages(self, feed, after):
+    with self._lock:
+      seq, messages = self._feeds.get(feed, (0, ()))
+      return seq, _since(seq, list(messages), after)
+
+  def clear(self):
+    with self._lock:
+      self._entries.clear()
+
+
+def _since(seq, messages, after):
+  # The messages numbered after `after`, given the last `len(messages)` up to
+  # `seq`; None when some have been dropped (or `after` is None or unknown).
+  if after is None or after > seq or seq - after > len(messages):
+    return None
+  return messages[len(messages) - (seq - after):]
+
+
+class RedisBackend(object):
+  # Shared backend for multiple workers. `client` is anything with the
+  # redis-py get/set/mget/incr interface, so tests can pass a local stand-in
+  # such as fakeredis.FakeRedis() instead of a server.
+
+  def __init__(self, client, prefix='fyyur:'):
+    self.client = client
+    self.prefix = prefix
+
+  @classmethod
+  def from_url(cls, url, **kwargs):
+    import redis
+    return cls(redis.Redis.from_url(url), **kwargs)
+
+  def get(self, key):
+    return self.client.get(self.prefix + key)
+
+  def set(self, key, value, ttl):
+    self.client.set(self.prefix + key, value, ex=int(ttl))
+
+  def versions(self, scopes):
+    keys = [self.prefix + 'v:' + scope for scope in scopes]
+    values = self.client.mget(keys)
+    result = []
+    for key, value in zip(keys, values):
+      if value is None:
+        # An evicted or never-bumped version restarts from the clock, which
+        # is always ahead of any value it had before.
+        self.client.set(key, time.time_ns(), nx=True)
+        value = self.client.get(key)
+      result.append(int(value))
+    return result
+
+  def bump(self, scopes):
+    for scope in scopes:
+      self.client.incr(self.prefix + 'v:' + scope)
+
+  def publish(self, feed, message, keep):
+    # the list and its sequence number move together (MULTI/EXEC)
+    pipe = self.client.pipeline()
+    pipe.rpush(self.prefix + 'feed:' + feed, json.dumps(message))
+    pipe.ltrim(self.prefix + 'feed:' + feed, -keep, -1)
+    pipe.incr(self.prefix + 'seq:' + feed)
+    pipe.execute()
+
+  def messages(self, feed, after):
+    # one GET when nothing has been published since `after`
+    seq = int(self.client.get(self.prefix + 'seq:' + feed) or 0)
+    if seq == after:
+      return seq, []
+    pipe = self.client.pipeline()
+    pipe.get(self.prefix + 'seq:' + feed)
+    pipe.lrange(self.prefix + 'feed:' + feed, 0, -1)
+    seq, messages = pipe.execute()
+    seq = int(seq or 0)
+    return seq, _since(seq, [json.loads(message) for message in messages], after)
+
+  def clear(self):
+    pass
+
+
+class ResponseCache(object):
+
+  def __init__(self, app=None):
+    if app is not None:
+      self.init_app(app)
+
+  def init_app(self, app):
+    app.config.setdefault('CACHE_ENABLED', True)
+    app.config.setdefault('CACHE_BACKEND', 'memory')
+    app.config.setdefault('CACHE_REDIS_URL', None)
+    app.config.setdefault('CACHE_MAX_ENTRIES', 1024)
+    app.config.setdefault('CACHE_TTL', 300)
+    if app.config['CACHE_BACKEND'] == 'redis':
+      if not app.config['CACHE_REDIS_URL']:
+        raise RuntimeError('CACHE_BACKEND=redis needs CACHE_REDIS_URL')
+      backend = RedisBackend.from_url(app.config['CACHE_REDIS_URL'])
+    else:
+      backend = MemoryBackend(app.config['CACHE_MAX_ENTRIES'])
+    app.extensions['response_cache'] = backend
+
+  @property
+  def backend(self):
+    return current_app.extensions['response_cache']
+
+  def ttl(self):
+    # views may shorten it for the current request (see replica.py)
+    return g.get('cache_ttl', current_app.config['CACHE_TTL'])
+
+  def bump(self, *scopes):
+    # Invalidate everything cached under any of `scopes`.
+    self.backend.bump(scopes)
+
+  def publish(self, feed, message, keep=1000):
+    # Append JSON-serialisable `message` to `feed`, keeping the last `keep`.
+    self.backend.publish(feed, message, keep)
+
+  def messages(self, feed, after):
+    # (seq, the messages published to `feed` since seq `after`); the list is
+    # None when the feed no longer holds all of them.
+    return self.backend.messages(feed, after)
+
+  def _key(self, kind, name, args, scopes):
+    versions = self.backend.versions(scopes)
+    raw = json.dumps([kind, name, args, list(zip(scopes, versions))], sort_keys=True, default=str)
+    return kind + ':' + hashlib.sha1(raw.encode('utf-8')).hexdigest()
+
+  def fragment(self, name, args, scopes, producer):
+    # Return producer()'s JSON-serialisable result, cached under `scopes`.
+    if not current_app.config['CACHE_ENABLED']:
+      return producer()
+    key = self._key('fragment', name, args, scopes)
+    cached = self.backend.get(key)
+    if cached is not None:
+      return json.loads(cached)
+    value = producer()
+    self.backend.set(key, json.dumps(value), self.ttl())
+    return value
+
+  def _store_streamed(self, key, chunks):
+    # Pass a streamed body through, storing it once all of it has been sent
+    # (not if the client hangs up); the request context is gone by then, so
+    # bind the backend and TTL now.
+    backend, ttl = self.backend, self.ttl()
+    def passthrough():
+      body = []
+      for chunk in chunks:
+        body.append(chunk if isinstance(chunk, bytes) else chunk.encode('utf-8'))
+        yield chunk
+      backend.set(key, b''.join(body), ttl)
+    return passthrough()
+
+  def cached(self, *scopes):
+    # Cache a GET view's 200 response body. Scopes are formatted with the
+    # view arguments, so 'venue:{venue_id}' depends on that venue only.
+    def decorator(view):
+      @wraps(view)
+      def wrapper(**kwargs):
+        # pages render pending flash messages, which must not be shared
+        if (not current_app.config['CACHE_ENABLED'] or request.method != 'GET'
+            or session.get('_flashes')):
+          return view(**kwargs)
+        view_scopes = [scope.format(**kwargs) for scope in scopes]
+        # under @conditional, the database state the validator just saw
+        args = [sorted(kwargs.items()), sorted(request.args.items(multi=True)), g.get('etag')]
+        key = self._key('view', request.endpoint, args, view_scopes)
+        body = self.backend.get(key)
+        if body is not None:
+          return current_app.response_class(body, mimetype='text/html')
+        response = make_response(view(**kwargs))
+        if response.status_code == 200:
+          if response.is_streamed:
+            response.response = self._store_streamed(key, response.response)
+          else:
+            self.backend.set(key, response.get_data(), self.ttl())
+        return response
+      return wrapper
+    return decorator
+
+
+cache = ResponseCache()
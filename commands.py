@@ -0,0 +1,476 @@
+#----------------------------------------------------------------------------#
+# Commands.
+#
+# Registered on the app by create_app(); run as `flask counters roll` etc.
+#----------------------------------------------------------------------------#
+
+import csv
+import json
+import re
+import sys
+import time
+from bisect import bisect_left, insort
+from datetime import datetime, timedelta, timezone
+
+import click
+import dateutil.parser
+from dateutil.relativedelta import relativedelta
+from flask import current_app
+from flask.cli import AppGroup, with_appcontext
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.exc import IntegrityError
+
+from models import db, Venue, Artist, Show, refresh_show_counters, stale_show_counters, roll_past_shows, \
+  touch_show_partners, show_end, DEFAULT_SHOW_MINUTES, MAX_SHOW_MINUTES
+from cache import cache
+from autocomplete import autocomplete
+from assets import build as build_assets
+from views import shows_export_query, export_lines
+
+#----------------------------------------------------------------------------#
+# Show counters.
+#----------------------------------------------------------------------------#
+
+counters_cli = AppGroup('counters', help='Maintain the denormalised show counters.')
+
+@counters_cli.command('roll')
+@click.option('--lookback-hours', default=24, show_default=True,
+              help='Recount venues and artists with shows that started this recently.')
+def roll_counters(lookback_hours):
+  # Run periodically (e.g. hourly from cron) with a lookback longer than the interval.
+  currentTime = datetime.utcnow()
+  venues, artists = roll_past_shows(currentTime - timedelta(hours=lookback_hours), currentTime)
+  db.session.commit()
+  cache.bump('venues', 'artists')
+  click.echo('Rolled counters for {0} venues and {1} artists.'.format(venues, artists))
+
+@counters_cli.command('check')
+@click.option('--repair/--no-repair', default=False,
+              help='Rebuild every counter from shows after checking.')
+def check_counters(repair):
+  currentTime = datetime.utcnow()
+  stale_venues = stale_show_counters(Venue, Show.venue_id, currentTime)
+  stale_artists = stale_show_counters(Artist, Show.artist_id, currentTime)
+  click.echo('{0} venues and {1} artists have stale counters.'.format(stale_venues, stale_artists))
+  if repair:
+    refresh_show_counters(Venue, Show.venue_id, currentTime)
+    refresh_show_counters(Artist, Show.artist_id, currentTime)
+    db.session.commit()
+    cache.bump('venues', 'artists')
+    click.echo('Rebuilt all counters.')
+  elif stale_venues or stale_artists:
+    sys.exit(1)
+
+#----------------------------------------------------------------------------#
+# Show partitions.
+#
+# shows is range-partitioned by month on start_time (shows_y2024m06 holds
+# June 2024), with shows_default catching rows outside every partition.
+# Run `ensure` regularly (e.g. weekly from cron) so upcoming months have
+# their own partition, and `archive` to move old months out of the table.
+#----------------------------------------------------------------------------#
+
+partitions_cli = AppGroup('partitions', help='Maintain the monthly partitions of shows.')
+MONTH_PARTITION = re.compile(r'^shows_y(\d{4})m(\d{2})$')
+ARCHIVE_SCHEMA = 'archive'
+
+def month_start(when):
+  return datetime(when.year, when.month, 1)
+
+def show_partitions():
+  # (name, bound, estimated rows) of each partition attached to shows
+  return db.session.execute(db.text(
+    "SELECT c.relname, pg_get_expr(c.relpartbound, c.oid), c.reltuples::bigint "
+    "FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+    "WHERE i.inhparent = 'shows'::regclass ORDER BY c.relname")).fetchall()
+
+@partitions_cli.command('list')
+@with_appcontext
+def list_partitions():
+  for name, bound, rows in show_partitions():
+    click.echo('{0:<16} {1:>10} rows  {2}'.format(name, max(rows, 0), bound))
+
+@partitions_cli.command('ensure')
+@click.option('--months-ahead', default=12, show_default=True,
+              help='Create partitions up to this many months past the current one.')
+@with_appcontext
+def ensure_partitions(months_ahead):
+  # Shows that landed in shows_default for a month are moved into its new
+  # partition, so re-running after a gap is safe.
+  first = month_start(datetime.utcnow())
+  created = []
+  for offset in range(months_ahead + 1):
+    name = db.session.execute(db.text('SELECT shows_ensure_partition(:month)'),
+                              {'month': first + relativedelta(months=offset)}).scalar()
+    db.session.commit()
+    if name:
+      created.append(name)
+  click.echo('Created {0} partitions{1}'.format(len(created), ': ' + ', '.join(created) if created else '.'))
+
+@partitions_cli.command('archive')
+@click.option('--older-than-months', default=24, show_default=True,
+              help='Archive months that started more than this many months before the current one.')
+@click.option('--drop', is_flag=True,
+              help="Drop the old partitions instead of moving them to the '" + ARCHIVE_SCHEMA + "' schema.")
+@with_appcontext
+def archive_partitions(older_than_months, drop):
+  if older_than_months < 1:
+    raise click.BadParameter('must be at least 1', param_hint='--older-than-months')
+  cutoff = month_start(datetime.utcnow()) - relativedelta(months=older_than_months)
+  old = []
+  for name, _, _ in show_partitions():
+    match = MONTH_PARTITION.match(name)
+    if match and datetime(int(match.group(1)), int(match.group(2)), 1) < cutoff:
+      old.append(name)
+  if not old:
+    click.echo('Nothing to archive before {0:%Y-%m}.'.format(cutoff))
+    return
+
+  currentTime = datetime.utcnow()
+  if not drop:
+    db.session.execute(db.text('CREATE SCHEMA IF NOT EXISTS ' + ARCHIVE_SCHEMA))
+  for name in old:
+    # one transaction per month: DETACH locks shows only briefly
+    venue_ids = [row[0] for row in db.session.execute(db.text('SELECT DISTINCT venue_id FROM ' + name))]
+    artist_ids = [row[0] for row in db.session.execute(db.text('SELECT DISTINCT artist_id FROM ' + name))]
+    db.session.execute(db.text('ALTER TABLE shows DETACH PARTITION ' + name))
+    if drop:
+      db.session.execute(db.text('DROP TABLE ' + name))
+    else:
+      db.session.execute(db.text('ALTER TABLE {0} SET SCHEMA {1}'.format(name, ARCHIVE_SCHEMA)))
+    # archived shows no longer count towards their venues' and artists' pages
+    refresh_show_counters(Venue, Show.venue_id, currentTime, venue_ids)
+    refresh_show_counters(Artist, Show.artist_id, currentTime, artist_ids)
+    db.session.commit()
+    cache.bump('shows', 'venues', 'artists', *(
+      ['venue:{0}'.format(venue_id) for venue_id in venue_ids] +
+      ['artist:{0}'.format(artist_id) for artist_id in artist_ids]))
+    click.echo('{0} {1} ({2} venues, {3} artists recounted)'.format(
+      'Dropped' if drop else 'Archived', name, len(venue_ids), len(artist_ids)))
+
+#----------------------------------------------------------------------------#
+# Bulk import.
+#----------------------------------------------------------------------------#
+
+IMPORT_MODELS = {'venues': Venue, 'artists': Artist, 'shows': Show}
+# maintained by the app, never read from a file
+DERIVED_COLUMNS = {'upcoming_shows_count', 'past_shows_count', 'updated_at', 'search_vector'}
+# show rows may name their venue/artist instead of giving its id
+SHOW_REFERENCES = {'venue': (Venue, 'venue_id'), 'artist': (Artist, 'artist_id')}
+
+def read_rows(stream, format, rejected):
+  # Yield (line number, dict) pairs; empty CSV cells become None, and JSONL
+  # lines that aren't an object are rejected.
+  if format == 'csv':
+    reader = csv.DictReader(stream)
+    for row in reader:
+      yield reader.line_num, dict((key, value if value != '' else None) for key, value in row.items())
+  else:
+    for number, line in enumerate(stream, 1):
+      if line.strip():
+        try:
+          row = json.loads(line)
+        except ValueError as error:
+          rejected.append((number, 'invalid JSON: {0}'.format(error)))
+          continue
+        if not isinstance(row, dict):
+          rejected.append((number, 'not a JSON object'))
+          continue
+        yield number, row
+
+def read_batches(rows, size):
+  batch = []
+  for row in rows:
+    batch.append(row)
+    if len(batch) == size:
+      yield batch
+      batch = []
+  if batch:
+    yield batch
+
+def integer_cells(batch, columns, rejected):
+  # CSV cells are strings: turn `columns` into ints, so '3' and 3 name the
+  # same row, and reject the rows where one isn't an integer.
+  converted = []
+  for number, row in batch:
+    row = dict(row)
+    for column in columns:
+      if row.get(column) is not None:
+        try:
+          row[column] = int(row[column])
+        except (TypeError, ValueError):
+          rejected.append((number, '{0} is not an integer: {1!r}'.format(column, row[column])))
+          break
+    else:
+      converted.append((number, row))
+  return converted
+
+def resolve_names(model, names):
+  # Map each name to its id, or None when no row or several rows have it.
+  ids = {}
+  for name, entity_id, matches in db.session.query(
+      model.name, db.func.min(model.id), db.func.count(model.id)
+      ).filter(model.name.in_(names)).group_by(model.name):
+    ids[name] = entity_id if matches == 1 else None
+  return ids
+
+def resolve_show_references(batch, rejected):
+  # Replace 'venue'/'artist' names with ids, one query per model per batch.
+  resolved = []
+  names = dict((key, set(row[key] for _, row in batch if row.get(key) is not None)) for key in SHOW_REFERENCES)
+  ids = dict((key, resolve_names(model, names[key]) if names[key] else {})
+             for key, (model, _) in SHOW_REFERENCES.items())
+  for number, row in batch:
+    row = dict(row)
+    for key, (model, column) in SHOW_REFERENCES.items():
+      name = row.pop(key, None)
+      if row.get(column) is None and name is not None:
+        row[column] = ids[key].get(name)
+      if row.get(column) is None:
+        rejected.append((number, 'no single {0} named {1!r}'.format(key, name) if name else 'missing ' + column))
+        break
+    else:
+      try:
+        row['start_time'] = dateutil.parser.parse(row['start_time'])
+        if row['start_time'].tzinfo is not None:
+          # stored as naive UTC
+          row['start_time'] = row['start_time'].astimezone(timezone.utc).replace(tzinfo=None)
+      except (KeyError, TypeError, ValueError, OverflowError):
+        rejected.append((number, 'missing or invalid start_time: {0!r}'.format(row.get('start_time'))))
+        continue
+      resolved.append((number, row))
+  return resolved
+
+def upsert_statement(table, columns):
+  # INSERT, or UPDATE the other columns when the primary key already exists.
+  # Rows without their primary key (new venues/artists) are plain INSERTs.
+  key = [column.name for column in table.primary_key]
+  statement = insert(table)
+  if not set(key) <= set(columns):
+    return statement
+  updates = dict((column, statement.excluded[column]) for column in columns if column not in key)
+  if 'updated_at' in table.c:
+    updates['updated_at'] = db.func.timezone('utc', db.func.now())
+  return statement.on_conflict_do_update(index_elements=key, set_=updates)
+
+def load_batch(model, batch):
+  # One executemany per distinct set of columns in the batch. An upsert may
+  # not touch the same row twice, so the last of duplicate keys wins.
+  key = [column.name for column in model.__table__.primary_key]
+  groups = {}
+  for _, row in batch:
+    rows = groups.setdefault(tuple(sorted(row)), {})
+    rows[tuple(row.get(column) for column in key) if all(row.get(column) is not None for column in key) else len(rows)] = row
+  for columns, rows in groups.items():
+    db.session.execute(upsert_statement(model.__table__, columns), list(rows.values()))
+
+def reject_overlaps(batch, rejected):
+  # The web form's booking check (conflicting_shows() under FOR UPDATE) for a
+  # whole batch: the per-partition exclusion constraints miss shows that
+  # straddle a month boundary. Locks the batch's venues and artists, loads
+  # their stored shows around the batch's times in one query, and rejects
+  # each row that overlaps one of them or an earlier row of the batch. A row
+  # with a stored show's key replaces it rather than clashing with it.
+  if not batch:
+    return batch
+  venue_ids = sorted(set(row['venue_id'] for _, row in batch))
+  artist_ids = sorted(set(row['artist_id'] for _, row in batch))
+  for model, ids in ((Venue, venue_ids), (Artist, artist_ids)):
+    db.session.query(model.id).filter(model.id.in_(ids)).order_by(model.id).with_for_update().all()
+  low = min(row['start_time'] for _, row in batch) - timedelta(minutes=MAX_SHOW_MINUTES)
+  high = max(show_end(row['start_time'], row.get('duration_minutes') or MAX_SHOW_MINUTES) for _, row in batch)
+  stored = db.session.query(Show.venue_id, Show.artist_id, Show.start_time, Show.duration_minutes).filter(
+    db.or_(Show.venue_id.in_(venue_ids), Show.artist_id.in_(artist_ids)),
+    Show.start_time > low, Show.start_time < high)
+
+  # ('venue', id) / ('artist', id) -> sorted [(start, end, key)]; key -> duration
+  booked = {}
+  durations = {}
+  def book(key, start_time, end_time):
+    durations[key] = end_time - start_time
+    for owner in (('venue', key[0]), ('artist', key[1])):
+      insort(booked.setdefault(owner, []), (start_time, end_time, key))
+  def unbook(key):
+    duration = durations.pop(key)
+    for owner in (('venue', key[0]), ('artist', key[1])):
+      intervals = booked[owner]
+      del intervals[bisect_left(intervals, (key[2], key[2] + duration, key))]
+  def clashes(key, start_time, end_time):
+    for owner in (('venue', key[0]), ('artist', key[1])):
+      intervals = booked.get(owner, [])
+      for other_start, other_end, _ in intervals[bisect_left(intervals, (start_time - timedelta(minutes=MAX_SHOW_MINUTES),)):]:
+        if other_start >= end_time:
+          break
+        if other_end > start_time:
+          return True
+    return False
+
+  for venue_id, artist_id, start_time, duration_minutes in stored:
+    book((venue_id, artist_id, start_time), start_time, show_end(start_time, duration_minutes))
+  accepted = []
+  for number, row in batch:
+    key = (row['venue_id'], row['artist_id'], row['start_time'])
+    previous = durations.get(key)
+    if previous is not None:
+      unbook(key)
+    if row.get('duration_minutes') is not None:
+      end_time = show_end(row['start_time'], row['duration_minutes'])
+    else:
+      # an upsert that leaves duration_minutes alone keeps the stored one
+      end_time = row['start_time'] + (previous or timedelta(minutes=DEFAULT_SHOW_MINUTES))
+    if clashes(key, row['start_time'], end_time):
+      rejected.append((number, 'overlaps another booking of its venue or artist'))
+      if previous is not None:
+        book(key, row['start_time'], row['start_time'] + previous)
+      continue
+    book(key, row['start_time'], end_time)
+    accepted.append((number, row))
+  return accepted
+
+def load_show_batch(batch, rejected):
+  # Rejects overlapping rows (see reject_overlaps), then loads the batch
+  # under a savepoint and, if the database still refuses it (the exclusion
+  # constraints, a missing venue), row by row, rejecting the rows that
+  # fail. Returns the rows loaded.
+  batch = reject_overlaps(batch, rejected)
+  try:
+    with db.session.begin_nested():
+      load_batch(Show, batch)
+    return batch
+  except IntegrityError:
+    pass
+  loaded = []
+  for number, row in batch:
+    try:
+      with db.session.begin_nested():
+        load_batch(Show, [(number, row)])
+      loaded.append((number, row))
+    except IntegrityError as error:
+      rejected.append((number, 'overlaps another booking of its venue or artist'
+                       if getattr(error.orig, 'pgcode', None) == '23P01' else str(error.orig).splitlines()[0]))
+  return loaded
+
+def recount_show_batch(batch):
+  # Recount the venues and artists of a committed batch of shows and drop
+  # their cached pages, so an interrupted import leaves nothing stale.
+  currentTime = datetime.utcnow()
+  venue_ids = sorted(set(row['venue_id'] for _, row in batch))
+  artist_ids = sorted(set(row['artist_id'] for _, row in batch))
+  refresh_show_counters(Venue, Show.venue_id, currentTime, venue_ids)
+  refresh_show_counters(Artist, Show.artist_id, currentTime, artist_ids)
+  db.session.commit()
+  cache.bump('shows', 'venues', 'artists', *(
+    ['venue:{0}'.format(venue_id) for venue_id in venue_ids] +
+    ['artist:{0}'.format(artist_id) for artist_id in artist_ids]))
+
+@click.command('import', help=(
+  "Load venues, artists or shows from a CSV or JSONL file ('-' for stdin). "
+  "Rows that carry their primary key update the existing row; shows may give "
+  "'venue' and 'artist' names instead of ids."))
+@click.argument('kind', type=click.Choice(sorted(IMPORT_MODELS)))
+@click.argument('source', type=click.File('r', encoding='utf-8'))
+@click.option('--format', type=click.Choice(['csv', 'jsonl']),
+              help='Input format; defaults to the file extension.')
+@click.option('--batch-size', default=5000, show_default=True, help='Rows per executemany and commit.')
+@with_appcontext
+def import_rows(kind, source, format, batch_size):
+  model = IMPORT_MODELS[kind]
+  format = format or ('csv' if source.name.endswith('.csv') else 'jsonl')
+  allowed = set(column.name for column in model.__table__.columns) - DERIVED_COLUMNS
+  integers = [column.name for column in model.__table__.columns
+              if column.name in allowed and isinstance(column.type, db.Integer)]
+  if model is Show:
+    allowed |= set(SHOW_REFERENCES)
+
+  started = time.perf_counter()
+  loaded = 0
+  rejected = []
+  # ids of updated venues/artists
+  touched = set()
+  for batch in read_batches(read_rows(source, format, rejected), batch_size):
+    unknown = set(key for _, row in batch for key in row) - allowed
+    if unknown:
+      raise click.ClickException('unknown {0} columns: {1}'.format(kind, ', '.join(sorted(unknown))))
+    batch = integer_cells(batch, integers, rejected)
+    if model is Show:
+      batch = load_show_batch(resolve_show_references(batch, rejected), rejected)
+      db.session.commit()
+      if batch:
+        recount_show_batch(batch)
+    else:
+      touched.update(row['id'] for _, row in batch if row.get('id') is not None)
+      for _, row in batch:
+        # CSV cells list genres as 'Jazz, Blues'; JSONL gives an array
+        if 'genres' in row and not isinstance(row['genres'], list):
+          row['genres'] = [genre.strip() for genre in (row['genres'] or '').split(',') if genre.strip()]
+      load_batch(model, batch)
+      db.session.commit()
+    loaded += len(batch)
+    elapsed = time.perf_counter() - started
+    click.echo('{0}: {1} rows ({2:.0f} rows/s)'.format(kind, loaded, loaded / max(elapsed, 1e-9)))
+
+  if model is not Show:
+    # rows imported with explicit ids leave the serial sequence behind
+    table = model.__tablename__
+    db.session.execute(db.text(
+      "SELECT setval(pg_get_serial_sequence(:table, 'id'), coalesce(max(id), 1)) FROM " + table),
+      {'table': table})
+    singular = kind[:-1]
+    if touched:
+      # updated rows may be renamed; their partners' pages render the name
+      partner, show_fk, partner_fk = ((Artist, Show.artist_id, Show.venue_id) if model is Venue
+                                      else (Venue, Show.venue_id, Show.artist_id))
+      touch_show_partners(partner, show_fk, partner_fk, sorted(touched))
+    db.session.commit()
+    cache.bump(kind, singular + '-names', *['{0}:{1}'.format(singular, entity_id) for entity_id in touched])
+    autocomplete.reload()
+
+  for number, reason in sorted(rejected)[:20]:
+    click.echo('rejected row {0}: {1}'.format(number, reason), err=True)
+  elapsed = time.perf_counter() - started
+  click.echo('Imported {0} {1} in {2:.1f}s ({3:.0f} rows/s); {4} rejected.'.format(
+    loaded, kind, elapsed, loaded / max(elapsed, 1e-9), len(rejected)))
+  if rejected:
+    sys.exit(1)
+
+#----------------------------------------------------------------------------#
+# Export.
+#----------------------------------------------------------------------------#
+
+@click.command('export', help='Stream every show, with its venue and artist names, as CSV or JSONL.')
+@click.option('--format', type=click.Choice(['csv', 'jsonl']), default='csv', show_default=True)
+@click.option('--from', 'start', type=click.DateTime(['%Y-%m-%d']), help='First day to include.')
+@click.option('--to', 'end', type=click.DateTime(['%Y-%m-%d']), help='Last day to include.')
+@click.option('--venue-id', type=int)
+@click.option('--artist-id', type=int)
+@click.option('--city')
+@click.option('--output', '-o', type=click.File('w', encoding='utf-8'), default='-', help='Defaults to stdout.')
+@with_appcontext
+def export_shows(format, start, end, venue_id, artist_id, city, output):
+  if end is not None:
+    end += timedelta(days=1)
+  for chunk in export_lines(shows_export_query(start, end, venue_id, artist_id, city), format):
+    output.write(chunk)
+
+#----------------------------------------------------------------------------#
+# Static assets.
+#
+# Run `build` on deploy, before the workers start: they read the manifest it
+# writes when the app is created.
+#----------------------------------------------------------------------------#
+
+assets_cli = AppGroup('assets', help='Build the bundled, fingerprinted static files.')
+
+@assets_cli.command('build')
+@click.option('--minify/--no-minify', default=True, show_default=True,
+              help='Minify the bundles.')
+@click.option('--clean', is_flag=True,
+              help='Remove files from earlier builds.')
+@with_appcontext
+def build_assets_command(minify, clean):
+  try:
+    built = build_assets(current_app.static_folder, minify, clean)
+  except RuntimeError as error:
+    raise click.ClickException(str(error))
+  for name, (filename, size, suffixes) in sorted(built.items()):
+    click.echo('{0:<10} {1:<28} {2:>8} bytes  {3}'.format(name, filename, size, ' '.join(suffixes)))
@@ -0,0 +1,62 @@
+#----------------------------------------------------------------------------#
+# Conditional GET (ETag / Last-Modified) for the read pages.
+#
+# A view decorated with @conditional(validator) first calls
+# validator(**view_args), which should run one cheap query and return
+# (last_modified, etag_parts). When the client already holds that version the
+# view is skipped entirely and a 304 is returned. The ETag is also part of
+# the response-cache key (see cache.py).
+#----------------------------------------------------------------------------#
+
+import hashlib
+import json
+from datetime import timezone
+from functools import wraps
+
+from flask import current_app, g, request, session, make_response
+
+
+def _utc_naive(value):
+  if value is not None and value.tzinfo is not None:
+    value = value.astimezone(timezone.utc).replace(tzinfo=None)
+  return value
+
+
+def conditional(validator):
+  def decorator(view):
+    @wraps(view)
+    def wrapper(**kwargs):
+      # pages render pending flash messages, so those must always be sent
+      if request.method != 'GET' or session.get('_flashes'):
+        return view(**kwargs)
+      last_modified, etag_parts = validator(**kwargs)
+      # the query string selects a different representation (page, filter)
+      raw = json.dumps([request.endpoint, sorted(request.args.items(multi=True)), etag_parts], default=str)
+      etag = hashlib.sha1(raw.encode('utf-8')).hexdigest()
+      # @cache.cached keys the body on it, so a body cached before a change
+      # made elsewhere (another worker, a CLI command) is never sent under
+      # the new validator
+      g.etag = etag
+      # HTTP dates have one-second resolution
+      last_modified = _utc_naive(last_modified)
+      if last_modified is not None:
+        last_modified = last_modified.replace(microsecond=0)
+
+      if request.if_none_match:
+        not_modified = request.if_none_match.contains(etag)
+      else:
+        since = _utc_naive(request.if_modified_since)
+        not_modified = since is not None and last_modified is not None and last_modified <= since
+
+      if not_modified:
+        response = current_app.response_class(status=304)
+      else:
+        response = make_response(view(**kwargs))
+      response.set_etag(etag)
+      if last_modified is not None:
+        response.last_modified = last_modified
+      # let browsers and the CDN store the page but revalidate before reuse
+      response.cache_control.no_cache = True
+      return response
+    return wrapper
+  return decorator
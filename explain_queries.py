@@ -0,0 +1,82 @@
+"""Print EXPLAIN ANALYZE output for each query shape used by views.py.
+
+Run against a deployed database to confirm the planner is using the
+indexes on shows, venue and artist:
+
+  $ python explain_queries.py --venue-id 1 --artist-id 1 --term hop
+
+EXPLAIN ANALYZE executes the statements, so point it at a replica or
+run it off-peak on large tables.
+"""
+import argparse
+from datetime import datetime
+
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.sql.expression import ClauseElement, Executable
+
+from app import create_app
+from models import db, Venue, Artist
+from views import venue_areas_query, artists_query, name_search_query, text_search_query, shows_page_query, \
+  venue_detail_query, artist_detail_query
+
+
+class Explain(Executable, ClauseElement):
+  inherit_cache = False
+
+  def __init__(self, statement, analyze=True):
+    self.statement = statement
+    self.analyze = analyze
+
+
+@compiles(Explain, 'postgresql')
+def compile_explain(element, compiler, **kw):
+  prefix = 'EXPLAIN (ANALYZE, BUFFERS) ' if element.analyze else 'EXPLAIN '
+  return prefix + compiler.process(element.statement, **kw)
+
+
+def query_shapes(app, args):
+  currentTime = datetime.utcnow()
+  per_page = app.config['SHOWS_PER_PAGE'] + 1
+  cursor = (currentTime, 0, 0)
+  return [
+    ('venues', venue_areas_query()),
+    ('venues?genre=<genre>', venue_areas_query(args.genre)),
+    ('artists', artists_query()),
+    ('artists?genre=<genre>', artists_query(args.genre)),
+    ('search_venues', name_search_query(Venue, args.term)),
+    ('search_artists', name_search_query(Artist, args.term)),
+    ('search', text_search_query(args.term).limit(app.config['SEARCH_PER_PAGE'] + 1)),
+    ('shows', shows_page_query(currentTime).limit(per_page)),
+    ('shows?when=upcoming', shows_page_query(currentTime, when='upcoming').limit(per_page)),
+    ('shows?when=past', shows_page_query(currentTime, when='past').limit(per_page)),
+    ('shows?after=<cursor>', shows_page_query(currentTime, after=cursor).limit(per_page)),
+    ('shows?genre=<genre>', shows_page_query(currentTime, genre=args.genre).limit(per_page)),
+    ('show_venue', venue_detail_query(args.venue_id)),
+    ('show_artist', artist_detail_query(args.artist_id)),
+  ]
+
+
+def main():
+  parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+  parser.add_argument('--venue-id', type=int, default=1)
+  parser.add_argument('--artist-id', type=int, default=1)
+  parser.add_argument('--term', default='a', help='search term for the name searches')
+  parser.add_argument('--genre', default='Jazz', help='genre for the ?genre= filters')
+  parser.add_argument('--no-analyze', dest='analyze', action='store_false',
+                      help='plan only, without executing the statements')
+  args = parser.parse_args()
+
+  # no sessions are signed here, so any SECRET_KEY will do
+  app = create_app({'SECRET_KEY': 'explain'})
+  with app.app_context():
+    for name, query in query_shapes(app, args):
+      print('-- {0}'.format(name))
+      # ORM queries and the list pages' core selects alike
+      for line in db.session.execute(Explain(getattr(query, 'statement', query), args.analyze)):
+        print(line[0])
+      print()
+    db.session.rollback()
+
+
+if __name__ == '__main__':
+  main()
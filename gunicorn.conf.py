@@ -0,0 +1,29 @@
+import os
+
+# $ gunicorn  (reads this file from the working directory)
+wsgi_app = 'app:create_app()'
+bind = os.environ.get('BIND', '0.0.0.0:' + os.environ.get('PORT', '5000'))
+workers = int(os.environ.get('WEB_CONCURRENCY', 2))
+
+# Workers only see each other's writes (cache scope bumps) through a shared
+# cache backend; config.py picks redis once CACHE_REDIS_URL is set.
+if workers > 1:
+  os.environ.setdefault('CACHE_REDIS_URL', 'redis://localhost:6379/0')
+
+# Build the app (and import the models, templates and config) once in the
+# master so workers start fast and share those pages copy-on-write.
+preload_app = True
+
+
+def post_fork(server, worker):
+  # A connection opened in the master must never be shared with a child:
+  # drop any inherited pool so each worker opens its own connections.
+  from models import db
+  from autocomplete import autocomplete
+  app = server.app.wsgi()
+  with app.app_context():
+    for bind in [None] + list(app.config['SQLALCHEMY_BINDS'] or ()):
+      db.get_engine(app, bind=bind).dispose()
+    # load the typeahead index before the first request needs it
+    autocomplete.build()
+    db.session.remove()
@@ -0,0 +1,193 @@
+#----------------------------------------------------------------------------#
+# Per-request instrumentation.
+#
+# Counts and times every SQL statement and template render issued while
+# handling a request, reports them in a Server-Timing header, logs
+# statements slower than SLOW_QUERY_MS with their route and parameters, and
+# keeps per-route latency histograms that /_metrics serves as JSON.
+#
+# The same hooks drive a query guard: it flags requests that repeat one
+# statement shape QUERY_REPEAT_LIMIT times (the N+1 signature) or issue more
+# queries than the route's entry in QUERY_BUDGETS. QUERY_GUARD picks the
+# reaction: 'raise' (the default under TESTING), 'warn' (under DEBUG) or 'off'.
+#
+# Histograms are per process; with several workers, scrape each or sum them.
+#----------------------------------------------------------------------------#
+
+import re
+import threading
+import time
+from bisect import bisect_left
+from collections import Counter
+
+from flask import current_app, g, request, jsonify, has_request_context, before_render_template, template_rendered
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+# Upper bounds (ms) of the latency histogram buckets; the last one catches the rest.
+BUCKETS_MS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, float('inf'))
+
+
+# Bind placeholders in any paramstyle, and parenthesised lists of them, so
+# "IN (?, ?, ?)" and "IN (?)" count as the same statement shape.
+PLACEHOLDER = r'(?:\?|%s|%\(\w+\)s|:\w+)'
+PLACEHOLDER_LIST = re.compile(r'\(\s*' + PLACEHOLDER + r'(?:\s*,\s*' + PLACEHOLDER + r')*\s*\)')
+NUMBER = re.compile(r'\b\d+\b')
+
+
+class QueryGuardError(Exception):
+  pass
+
+class NPlusOneError(QueryGuardError):
+  pass
+
+class QueryBudgetExceeded(QueryGuardError):
+  pass
+
+
+def statement_shape(statement):
+  shape = PLACEHOLDER_LIST.sub('(?)', ' '.join(statement.split()))
+  return NUMBER.sub('?', shape)
+
+
+class RouteHistogram(object):
+
+  def __init__(self):
+    self.buckets = [0] * len(BUCKETS_MS)
+    self.count = 0
+    self.total_ms = 0.0
+    self.db_ms = 0.0
+    self.queries = 0
+
+  def observe(self, total_ms, db_ms, queries):
+    self.buckets[bisect_left(BUCKETS_MS, total_ms)] += 1
+    self.count += 1
+    self.total_ms += total_ms
+    self.db_ms += db_ms
+    self.queries += queries
+
+  def as_dict(self):
+    return {
+      'count': self.count,
+      'buckets': [['+Inf' if bound == float('inf') else bound, hits]
+                  for bound, hits in zip(BUCKETS_MS, self.buckets)],
+      'mean_ms': round(self.total_ms / self.count, 3) if self.count else None,
+      'mean_db_ms': round(self.db_ms / self.count, 3) if self.count else None,
+      'queries_per_request': round(self.queries / self.count, 2) if self.count else None,
+    }
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+  conn.info.setdefault('query_started', []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+  elapsed_ms = (time.perf_counter() - conn.info['query_started'].pop()) * 1000
+  if not has_request_context() or 'request_started' not in g:
+    return
+  g.db_ms += elapsed_ms
+  g.db_queries += 1
+  if current_app.config['QUERY_GUARD'] != 'off':
+    g.db_statements.append(statement)
+  if elapsed_ms >= current_app.config['SLOW_QUERY_MS']:
+    current_app.logger.warning('slow query (%.1fms) in %s %s: %s params=%.500r',
+      elapsed_ms, request.method, request.endpoint, ' '.join(statement.split()), parameters)
+
+
+class RequestMetrics(object):
+
+  def __init__(self, app=None):
+    if app is not None:
+      self.init_app(app)
+
+  def init_app(self, app):
+    app.config.setdefault('SLOW_QUERY_MS', 100)
+    app.config.setdefault('METRICS_ENABLED', True)
+    app.config.setdefault('QUERY_GUARD', 'raise' if app.testing else 'warn' if app.debug else 'off')
+    app.config.setdefault('QUERY_REPEAT_LIMIT', 3)
+    app.config.setdefault('QUERY_BUDGETS', {})
+
+    # listen on the Engine class so every bind (and engines created later) is
+    # covered; once per process, however many apps are created
+    if not event.contains(Engine, 'before_cursor_execute', _before_cursor_execute):
+      event.listen(Engine, 'before_cursor_execute', _before_cursor_execute)
+      event.listen(Engine, 'after_cursor_execute', _after_cursor_execute)
+    before_render_template.connect(self._before_render, app)
+    template_rendered.connect(self._after_render, app)
+    app.before_request(self._start_request)
+    app.after_request(self._finish_request)
+    if app.config['METRICS_ENABLED']:
+      app.add_url_rule('/_metrics', 'metrics', self.metrics_view)
+    app.extensions['request_metrics'] = {'histograms': {}, 'lock': threading.Lock()}
+
+  def _start_request(self):
+    g.request_started = time.perf_counter()
+    g.db_ms = 0.0
+    g.db_queries = 0
+    g.template_ms = 0.0
+    g.db_statements = []
+
+  def _before_render(self, sender, template, context, **extra):
+    if 'request_started' in g:
+      g.template_started = time.perf_counter()
+
+  def _after_render(self, sender, template, context, **extra):
+    if 'template_started' in g:
+      g.template_ms += (time.perf_counter() - g.pop('template_started')) * 1000
+
+  def _finish_request(self, response):
+    if 'request_started' not in g:
+      return response
+    request_g = g._get_current_object()
+    app = current_app._get_current_object()
+    method, endpoint = request.method, request.endpoint
+    total_ms = (time.perf_counter() - g.request_started) * 1000
+    if response.is_streamed:
+      # a streamed body runs its queries and renders after the headers go
+      # out, so they can only say how long the response took to start; the
+      # request is recorded once the server has sent all of the body
+      response.headers['Server-Timing'] = 'total;dur={0:.1f}'.format(total_ms)
+      response.call_on_close(lambda: self._record(app, method, endpoint, request_g))
+    else:
+      response.headers['Server-Timing'] = (
+        'db;dur={0:.1f};desc="{1} queries", tpl;dur={2:.1f}, total;dur={3:.1f}'.format(
+          g.db_ms, g.db_queries, g.template_ms, total_ms))
+      self._record(app, method, endpoint, request_g)
+    return response
+
+  def _record(self, app, method, endpoint, request_g):
+    total_ms = (time.perf_counter() - request_g.request_started) * 1000
+    route = '{0} {1}'.format(method, endpoint)
+    state = app.extensions['request_metrics']
+    with state['lock']:
+      histogram = state['histograms'].get(route)
+      if histogram is None:
+        histogram = state['histograms'][route] = RouteHistogram()
+      histogram.observe(total_ms, request_g.db_ms, request_g.db_queries)
+    if app.config['QUERY_GUARD'] != 'off':
+      self._guard(app, method, endpoint, request_g.db_statements)
+
+  def _guard(self, app, method, endpoint, statements):
+    problems = []
+    limit = app.config['QUERY_REPEAT_LIMIT']
+    shape, repeats = (Counter(statement_shape(statement) for statement in statements).most_common(1) or [(None, 0)])[0]
+    if repeats >= limit:
+      problems.append(NPlusOneError('{0} {1} ran the same statement {2} times (likely N+1): {3}'.format(
+        method, endpoint, repeats, shape)))
+    budget = app.config['QUERY_BUDGETS'].get(endpoint)
+    if budget is not None and len(statements) > budget:
+      problems.append(QueryBudgetExceeded('{0} {1} issued {2} queries; its budget is {3}'.format(
+        method, endpoint, len(statements), budget)))
+    for problem in problems:
+      if app.config['QUERY_GUARD'] == 'raise':
+        raise problem
+      app.logger.warning('%s', problem)
+
+  def metrics_view(self):
+    state = current_app.extensions['request_metrics']
+    with state['lock']:
+      routes = dict((route, histogram.as_dict()) for route, histogram in state['histograms'].items())
+    return jsonify({'routes': routes})
+
+
+metrics = RequestMetrics()
@@ -0,0 +1,31 @@
+"""trigram indexes for venue and artist name search
+
+Revision ID: 3f1c9a2b7d4e
+Revises: 78e5d5a6ccf7
+Create Date: 2026-10-18 09:12:44.318207
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3f1c9a2b7d4e'
+down_revision = '78e5d5a6ccf7'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # pg_trgm lets GIN indexes serve ILIKE '%term%' instead of a seq scan.
+    op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    op.create_index('ix_venue_name_trgm', 'venue', ['name'], unique=False,
+                    postgresql_using='gin', postgresql_ops={'name': 'gin_trgm_ops'})
+    op.create_index('ix_artist_name_trgm', 'artist', ['name'], unique=False,
+                    postgresql_using='gin', postgresql_ops={'name': 'gin_trgm_ops'})
+
+
+def downgrade():
+    op.drop_index('ix_artist_name_trgm', table_name='artist')
+    op.drop_index('ix_venue_name_trgm', table_name='venue')
+    # The extension is left installed; other objects may depend on it.
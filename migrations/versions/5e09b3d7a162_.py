@@ -0,0 +1,27 @@
+"""updated_at on venue, artist and shows for conditional GET
+
+Revision ID: 5e09b3d7a162
+Revises: c2b7e91f04ad
+Create Date: 2026-10-18 13:41:52.274630
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5e09b3d7a162'
+down_revision = 'c2b7e91f04ad'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # The server default backfills existing rows; the app sets it afterwards.
+    for table in ('venue', 'artist', 'shows'):
+        op.add_column(table, sa.Column('updated_at', sa.DateTime(), server_default=sa.text("(now() at time zone 'utc')"), nullable=False))
+
+
+def downgrade():
+    for table in ('shows', 'artist', 'venue'):
+        op.drop_column(table, 'updated_at')
@@ -0,0 +1,118 @@
+"""show durations, overlap exclusion constraints and venue calendar index
+
+Revision ID: 7c4d1e9a3b58
+Revises: e6a27f4c9d15
+Create Date: 2026-10-18 22:14:05.402917
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '7c4d1e9a3b58'
+down_revision = 'e6a27f4c9d15'
+branch_labels = None
+depends_on = None
+
+# Exclusion constraints must include the partition key with equality when
+# declared on a partitioned table, so each partition carries its own: no
+# two shows of one venue, or of one artist, in the same partition overlap.
+EXCLUDE_OVERLAPS = """
+    CREATE FUNCTION shows_exclude_overlaps(partition text) RETURNS void AS $$
+    BEGIN
+        EXECUTE format('ALTER TABLE %I ADD CONSTRAINT %I EXCLUDE USING gist '
+                       '(venue_id WITH =, tsrange(start_time, start_time + duration_minutes * interval ''1 minute'') WITH &&)',
+                       partition, partition || '_venue_overlap');
+        EXECUTE format('ALTER TABLE %I ADD CONSTRAINT %I EXCLUDE USING gist '
+                       '(artist_id WITH =, tsrange(start_time, start_time + duration_minutes * interval ''1 minute'') WITH &&)',
+                       partition, partition || '_artist_overlap');
+    END
+    $$ LANGUAGE plpgsql
+"""
+
+ENSURE_PARTITION = """
+    CREATE OR REPLACE FUNCTION shows_ensure_partition(month timestamp) RETURNS text AS $$
+    DECLARE
+        low timestamp := date_trunc('month', month);
+        high timestamp := date_trunc('month', month) + interval '1 month';
+        partition text := 'shows_y' || to_char(low, 'YYYY') || 'm' || to_char(low, 'MM');
+    BEGIN
+        IF to_regclass(partition) IS NOT NULL THEN
+            RETURN NULL;
+        END IF;
+        EXECUTE format('CREATE TABLE %I (LIKE shows INCLUDING DEFAULTS INCLUDING CONSTRAINTS)', partition);
+        PERFORM shows_exclude_overlaps(partition);
+        EXECUTE format('WITH moved AS (DELETE FROM shows_default WHERE start_time >= %L AND start_time < %L RETURNING *) '
+                       'INSERT INTO %I SELECT * FROM moved', low, high, partition);
+        EXECUTE format('ALTER TABLE shows ATTACH PARTITION %I FOR VALUES FROM (%L) TO (%L)', partition, low, high);
+        RETURN partition;
+    END
+    $$ LANGUAGE plpgsql
+"""
+
+PREVIOUS_ENSURE_PARTITION = """
+    CREATE OR REPLACE FUNCTION shows_ensure_partition(month timestamp) RETURNS text AS $$
+    DECLARE
+        low timestamp := date_trunc('month', month);
+        high timestamp := date_trunc('month', month) + interval '1 month';
+        partition text := 'shows_y' || to_char(low, 'YYYY') || 'm' || to_char(low, 'MM');
+    BEGIN
+        IF to_regclass(partition) IS NOT NULL THEN
+            RETURN NULL;
+        END IF;
+        EXECUTE format('CREATE TABLE %I (LIKE shows INCLUDING DEFAULTS)', partition);
+        EXECUTE format('WITH moved AS (DELETE FROM shows_default WHERE start_time >= %L AND start_time < %L RETURNING *) '
+                       'INSERT INTO %I SELECT * FROM moved', low, high, partition);
+        EXECUTE format('ALTER TABLE shows ATTACH PARTITION %I FOR VALUES FROM (%L) TO (%L)', partition, low, high);
+        RETURN partition;
+    END
+    $$ LANGUAGE plpgsql
+"""
+
+
+def upgrade():
+    op.execute('CREATE EXTENSION IF NOT EXISTS btree_gist')
+    op.add_column('shows', sa.Column('duration_minutes', sa.Integer(), server_default='120', nullable=False))
+    # Existing shows had no length: give each the default, cut short where
+    # the venue's or the artist's next show starts sooner, so the
+    # constraints below hold for the rows already booked.
+    op.execute("""
+        UPDATE shows SET duration_minutes = least(120, gaps.venue_gap, gaps.artist_gap)
+        FROM (
+            SELECT venue_id, artist_id, start_time,
+                   coalesce(floor(extract(epoch FROM lead(start_time) OVER (PARTITION BY venue_id ORDER BY start_time) - start_time) / 60), 120) AS venue_gap,
+                   coalesce(floor(extract(epoch FROM lead(start_time) OVER (PARTITION BY artist_id ORDER BY start_time) - start_time) / 60), 120) AS artist_gap
+            FROM shows
+        ) AS gaps
+        WHERE shows.venue_id = gaps.venue_id AND shows.artist_id = gaps.artist_id AND shows.start_time = gaps.start_time
+          AND least(gaps.venue_gap, gaps.artist_gap) < 120
+    """)
+    op.create_check_constraint('shows_ck_duration_minutes', 'shows', 'duration_minutes BETWEEN 0 AND 1440')
+    op.create_index('ix_shows_venue_id_start_time', 'shows', ['venue_id', 'start_time'], unique=False)
+
+    op.execute(EXCLUDE_OVERLAPS)
+    op.execute(ENSURE_PARTITION)
+    op.execute("SELECT shows_exclude_overlaps(c.relname) FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+               "WHERE i.inhparent = 'shows'::regclass")
+
+
+def downgrade():
+    op.execute("""
+        DO $$
+        DECLARE
+            partition text;
+        BEGIN
+            FOR partition IN SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid
+                             WHERE i.inhparent = 'shows'::regclass LOOP
+                EXECUTE format('ALTER TABLE %I DROP CONSTRAINT IF EXISTS %I', partition, partition || '_venue_overlap');
+                EXECUTE format('ALTER TABLE %I DROP CONSTRAINT IF EXISTS %I', partition, partition || '_artist_overlap');
+            END LOOP;
+        END
+        $$
+    """)
+    op.execute(PREVIOUS_ENSURE_PARTITION)
+    op.execute('DROP FUNCTION shows_exclude_overlaps(text)')
+    op.drop_index('ix_shows_venue_id_start_time', table_name='shows')
+    op.drop_constraint('shows_ck_duration_minutes', 'shows', type_='check')
+    op.drop_column('shows', 'duration_minutes')
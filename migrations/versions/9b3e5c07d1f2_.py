@@ -0,0 +1,72 @@
+"""full-text search vectors on venue and artist, kept by triggers
+
+Revision ID: 9b3e5c07d1f2
+Revises: d41f6b8e2a97
+Create Date: 2026-10-18 20:31:44.902716
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision = '9b3e5c07d1f2'
+down_revision = 'd41f6b8e2a97'
+branch_labels = None
+depends_on = None
+
+# Weights rank a name match above genres, and those above location.
+DOCUMENTS = {
+    'venue': """
+        setweight(to_tsvector('english', coalesce(NEW.name, '')), 'A') ||
+        setweight(to_tsvector('english', array_to_string(NEW.genres, ' ')), 'B') ||
+        setweight(to_tsvector('english', coalesce(NEW.city, '') || ' ' || coalesce(NEW.state, '')), 'C') ||
+        setweight(to_tsvector('english', coalesce(NEW.address, '')), 'D')
+    """,
+    'artist': """
+        setweight(to_tsvector('english', coalesce(NEW.name, '')), 'A') ||
+        setweight(to_tsvector('english', array_to_string(NEW.genres, ' ')), 'B') ||
+        setweight(to_tsvector('english', coalesce(NEW.city, '') || ' ' || coalesce(NEW.state, '')), 'C')
+    """,
+}
+COLUMNS = {
+    'venue': 'name, genres, city, state, address',
+    'artist': 'name, genres, city, state',
+}
+
+
+def upgrade():
+    for table, document in DOCUMENTS.items():
+        op.add_column(table, sa.Column('search_vector', postgresql.TSVECTOR(), nullable=True))
+        op.execute("""
+            CREATE FUNCTION {0}_search_vector() RETURNS trigger AS $$
+            BEGIN
+                NEW.search_vector := {1};
+                RETURN NEW;
+            END
+            $$ LANGUAGE plpgsql
+        """.format(table, document))
+        # Only writes to the indexed columns pay for the rebuild; counter
+        # and updated_at updates leave the vector alone.
+        op.execute("""
+            CREATE TRIGGER {0}_search_vector BEFORE INSERT OR UPDATE OF {1} ON {0}
+            FOR EACH ROW EXECUTE FUNCTION {0}_search_vector()
+        """.format(table, COLUMNS[table]))
+        # Backfill by firing the trigger on every existing row.
+        op.execute('UPDATE {0} SET name = name'.format(table))
+    # CREATE INDEX CONCURRENTLY cannot run inside a transaction block.
+    with op.get_context().autocommit_block():
+        for table in DOCUMENTS:
+            op.create_index('ix_{0}_search_vector'.format(table), table, ['search_vector'], unique=False,
+                            postgresql_using='gin', postgresql_concurrently=True)
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        for table in DOCUMENTS:
+            op.drop_index('ix_{0}_search_vector'.format(table), table_name=table, postgresql_concurrently=True)
+    for table in DOCUMENTS:
+        op.execute('DROP TRIGGER {0}_search_vector ON {0}'.format(table))
+        op.execute('DROP FUNCTION {0}_search_vector()'.format(table))
+        op.drop_column(table, 'search_vector')
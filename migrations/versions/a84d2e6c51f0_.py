@@ -0,0 +1,32 @@
+"""secondary indexes on shows for artist and start_time lookups
+
+Revision ID: a84d2e6c51f0
+Revises: 3f1c9a2b7d4e
+Create Date: 2026-10-18 10:03:27.551940
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a84d2e6c51f0'
+down_revision = '3f1c9a2b7d4e'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # CREATE INDEX CONCURRENTLY cannot run inside a transaction block, and
+    # does not lock out writes to shows while it builds.
+    with op.get_context().autocommit_block():
+        op.create_index('ix_shows_artist_id_start_time', 'shows', ['artist_id', 'start_time'],
+                        unique=False, postgresql_concurrently=True)
+        op.create_index('ix_shows_start_time', 'shows', ['start_time'],
+                        unique=False, postgresql_concurrently=True)
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        op.drop_index('ix_shows_start_time', table_name='shows', postgresql_concurrently=True)
+        op.drop_index('ix_shows_artist_id_start_time', table_name='shows', postgresql_concurrently=True)
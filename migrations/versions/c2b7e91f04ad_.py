@@ -0,0 +1,39 @@
+"""denormalised upcoming/past show counters on venue and artist
+
+Revision ID: c2b7e91f04ad
+Revises: a84d2e6c51f0
+Create Date: 2026-10-18 11:26:09.802114
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c2b7e91f04ad'
+down_revision = 'a84d2e6c51f0'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('venue', sa.Column('upcoming_shows_count', sa.Integer(), server_default='0', nullable=False))
+    op.add_column('venue', sa.Column('past_shows_count', sa.Integer(), server_default='0', nullable=False))
+    op.add_column('artist', sa.Column('upcoming_shows_count', sa.Integer(), server_default='0', nullable=False))
+    op.add_column('artist', sa.Column('past_shows_count', sa.Integer(), server_default='0', nullable=False))
+    # Backfill; afterwards `flask counters roll` keeps them current.
+    for table, fk in (('venue', 'venue_id'), ('artist', 'artist_id')):
+        op.execute("""
+            UPDATE {table} SET
+              upcoming_shows_count = (SELECT count(*) FROM shows
+                                      WHERE shows.{fk} = {table}.id AND shows.start_time > now() at time zone 'utc'),
+              past_shows_count = (SELECT count(*) FROM shows
+                                  WHERE shows.{fk} = {table}.id AND shows.start_time <= now() at time zone 'utc')
+        """.format(table=table, fk=fk))
+
+
+def downgrade():
+    op.drop_column('artist', 'past_shows_count')
+    op.drop_column('artist', 'upcoming_shows_count')
+    op.drop_column('venue', 'past_shows_count')
+    op.drop_column('venue', 'upcoming_shows_count')
@@ -0,0 +1,51 @@
+"""genres as a text array with GIN indexes on venue and artist
+
+Revision ID: d41f6b8e2a97
+Revises: 5e09b3d7a162
+Create Date: 2026-10-18 20:12:09.318245
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision = 'd41f6b8e2a97'
+down_revision = '5e09b3d7a162'
+branch_labels = None
+depends_on = None
+
+# Existing values are a single genre, a comma-separated list or an array
+# literal ('{Jazz,Blues}') left by the old form handlers; NULL and blank
+# become an empty array.
+BACKFILL = """
+    CASE
+        WHEN genres IS NULL OR btrim(genres) = '' THEN '{}'::varchar(120)[]
+        WHEN left(btrim(genres), 1) = '{' THEN btrim(genres)::varchar(120)[]
+        ELSE regexp_split_to_array(btrim(genres), '\\s*,\\s*')::varchar(120)[]
+    END
+"""
+
+
+def upgrade():
+    for table in ('venue', 'artist'):
+        op.alter_column(table, 'genres', type_=postgresql.ARRAY(sa.String(length=120)),
+                        postgresql_using=BACKFILL, server_default='{}', nullable=False)
+    # CREATE INDEX CONCURRENTLY cannot run inside a transaction block.
+    with op.get_context().autocommit_block():
+        op.create_index('ix_venue_genres', 'venue', ['genres'], unique=False,
+                        postgresql_using='gin', postgresql_concurrently=True)
+        op.create_index('ix_artist_genres', 'artist', ['genres'], unique=False,
+                        postgresql_using='gin', postgresql_concurrently=True)
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        op.drop_index('ix_artist_genres', table_name='artist', postgresql_concurrently=True)
+        op.drop_index('ix_venue_genres', table_name='venue', postgresql_concurrently=True)
+    for table in ('artist', 'venue'):
+        # the array default can't be cast, so drop it before the type
+        op.alter_column(table, 'genres', server_default=None, nullable=True)
+        op.alter_column(table, 'genres', type_=sa.String(length=120),
+                        postgresql_using="array_to_string(genres, ', ')")
@@ -0,0 +1,93 @@
+"""range-partition shows by month on start_time
+
+Revision ID: e6a27f4c9d15
+Revises: 9b3e5c07d1f2
+Create Date: 2026-10-18 21:02:37.114820
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e6a27f4c9d15'
+down_revision = '9b3e5c07d1f2'
+branch_labels = None
+depends_on = None
+
+# Creates the month partition containing `month` unless it exists, first
+# moving any of its rows out of shows_default (ATTACH would refuse
+# otherwise). Used below and by `flask partitions ensure`.
+ENSURE_PARTITION = """
+    CREATE FUNCTION shows_ensure_partition(month timestamp) RETURNS text AS $$
+    DECLARE
+        low timestamp := date_trunc('month', month);
+        high timestamp := date_trunc('month', month) + interval '1 month';
+        partition text := 'shows_y' || to_char(low, 'YYYY') || 'm' || to_char(low, 'MM');
+    BEGIN
+        IF to_regclass(partition) IS NOT NULL THEN
+            RETURN NULL;
+        END IF;
+        EXECUTE format('CREATE TABLE %I (LIKE shows INCLUDING DEFAULTS)', partition);
+        EXECUTE format('WITH moved AS (DELETE FROM shows_default WHERE start_time >= %L AND start_time < %L RETURNING *) '
+                       'INSERT INTO %I SELECT * FROM moved', low, high, partition);
+        EXECUTE format('ALTER TABLE shows ATTACH PARTITION %I FOR VALUES FROM (%L) TO (%L)', partition, low, high);
+        RETURN partition;
+    END
+    $$ LANGUAGE plpgsql
+"""
+
+
+def create_shows(name, **kw):
+    op.create_table(name,
+    sa.Column('venue_id', sa.Integer(), nullable=False),
+    sa.Column('artist_id', sa.Integer(), nullable=False),
+    sa.Column('start_time', sa.DateTime(), nullable=False),
+    sa.Column('updated_at', sa.DateTime(), server_default=sa.text("(now() at time zone 'utc')"), nullable=False),
+    sa.ForeignKeyConstraint(['artist_id'], ['artist.id'], ondelete='CASCADE'),
+    sa.ForeignKeyConstraint(['venue_id'], ['venue.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('venue_id', 'artist_id', 'start_time', name=name + '_pkey'),
+    **kw
+    )
+
+
+def upgrade():
+    op.execute('ALTER TABLE shows RENAME TO shows_legacy')
+    op.execute('ALTER INDEX shows_pkey RENAME TO shows_legacy_pkey')
+    op.execute('DROP INDEX ix_shows_artist_id_start_time')
+    op.execute('DROP INDEX ix_shows_start_time')
+
+    create_shows('shows', postgresql_partition_by='RANGE (start_time)')
+    # created on the parent, these cascade to every partition
+    op.create_index('ix_shows_artist_id_start_time', 'shows', ['artist_id', 'start_time'], unique=False)
+    op.create_index('ix_shows_start_time', 'shows', ['start_time'], unique=False)
+    # catches rows outside every month partition, so inserts never fail
+    op.execute('CREATE TABLE shows_default PARTITION OF shows DEFAULT')
+    op.execute(ENSURE_PARTITION)
+
+    # one partition per month from the oldest show to a year ahead
+    op.execute("""
+        SELECT shows_ensure_partition(month)
+        FROM (
+            SELECT date_trunc('month', coalesce(min(start_time), now() at time zone 'utc')) AS first,
+                   greatest(max(start_time), now() at time zone 'utc' + interval '12 months') AS last
+            FROM shows_legacy
+        ) AS bounds, generate_series(first, last, interval '1 month') AS month
+    """)
+    op.execute('INSERT INTO shows (venue_id, artist_id, start_time, updated_at) '
+               'SELECT venue_id, artist_id, start_time, updated_at FROM shows_legacy')
+    op.execute('DROP TABLE shows_legacy')
+    op.execute('ANALYZE shows')
+
+
+def downgrade():
+    # Partitions already detached by `flask partitions archive` are not
+    # brought back.
+    create_shows('shows_flat')
+    op.execute('INSERT INTO shows_flat SELECT venue_id, artist_id, start_time, updated_at FROM shows')
+    op.execute('DROP TABLE shows CASCADE')
+    op.execute('DROP FUNCTION shows_ensure_partition(timestamp)')
+    op.execute('ALTER TABLE shows_flat RENAME TO shows')
+    op.execute('ALTER INDEX shows_flat_pkey RENAME TO shows_pkey')
+    op.create_index('ix_shows_artist_id_start_time', 'shows', ['artist_id', 'start_time'], unique=False)
+    op.create_index('ix_shows_start_time', 'shows', ['start_time'], unique=False)
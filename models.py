@@ -0,0 +1,197 @@
+#----------------------------------------------------------------------------#
+# Imports
+#----------------------------------------------------------------------------#
+
+from datetime import datetime, timedelta
+from sqlalchemy.dialects.postgresql import ARRAY, TSVECTOR
+from replica import RoutingSQLAlchemy
+
+db = RoutingSQLAlchemy()
+
+# Show lengths, in minutes; shows_ck_duration_minutes enforces the bounds.
+DEFAULT_SHOW_MINUTES = 120
+MAX_SHOW_MINUTES = 24 * 60
+
+#----------------------------------------------------------------------------#
+# Models.
+#----------------------------------------------------------------------------#
+
+class Venue(db.Model):
+    __tablename__ = 'venue'
+    __table_args__ = (
+        db.Index('ix_venue_name_trgm', 'name', postgresql_using='gin', postgresql_ops={'name': 'gin_trgm_ops'}),
+        # serves the ?genre= filters (genres @> ARRAY[...])
+        db.Index('ix_venue_genres', 'genres', postgresql_using='gin'),
+        db.Index('ix_venue_search_vector', 'search_vector', postgresql_using='gin'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String)
+    city = db.Column(db.String(120))
+    state = db.Column(db.String(120))
+    address = db.Column(db.String(120))
+    phone = db.Column(db.String(120))
+    image_link = db.Column(db.String(500))
+    facebook_link = db.Column(db.String(120))
+    
+    # TODO: implement any missing fields, as a database migration using Flask-Migrate
+    
+    genres=db.Column(ARRAY(db.String(120)), nullable=False, default=list, server_default='{}')
+    # Denormalised show counts, maintained by the show write paths and
+    # refresh_show_counters(); see the `flask counters` commands.
+    upcoming_shows_count=db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    past_shows_count=db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    # Drives the ETag/Last-Modified of the venue's pages; set on every UPDATE.
+    updated_at=db.Column(db.DateTime, nullable=False, default=datetime.utcnow, onupdate=datetime.utcnow, server_default=db.text("(now() at time zone 'utc')"))
+    # Full-text document over name, genres, city, state and address, written
+    # by the venue_search_vector trigger; deferred as pages never render it.
+    search_vector=db.deferred(db.Column(TSVECTOR, server_default=db.FetchedValue(), server_onupdate=db.FetchedValue()))
+    shows=db.relationship('Show',backref='venue',passive_deletes=True,lazy=True)
+
+class Artist(db.Model):
+    __tablename__ = 'artist'
+    __table_args__ = (
+        db.Index('ix_artist_name_trgm', 'name', postgresql_using='gin', postgresql_ops={'name': 'gin_trgm_ops'}),
+        db.Index('ix_artist_genres', 'genres', postgresql_using='gin'),
+        db.Index('ix_artist_search_vector', 'search_vector', postgresql_using='gin'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String)
+    city = db.Column(db.String(120))
+    state = db.Column(db.String(120))
+    phone = db.Column(db.String(120))
+    image_link = db.Column(db.String(500))
+    facebook_link = db.Column(db.String(120))
+    
+    # TODO: implement any missing fields, as a database migration using Flask-Migrate
+    genres=db.Column(ARRAY(db.String(120)), nullable=False, default=list, server_default='{}')
+    upcoming_shows_count=db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    past_shows_count=db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    updated_at=db.Column(db.DateTime, nullable=False, default=datetime.utcnow, onupdate=datetime.utcnow, server_default=db.text("(now() at time zone 'utc')"))
+    search_vector=db.deferred(db.Column(TSVECTOR, server_default=db.FetchedValue(), server_onupdate=db.FetchedValue()))
+    shows=db.relationship('Show',backref='artist',passive_deletes=True,lazy=True)
+    
+# TODO Implement Show and Artist models, and complete all model relationships and properties, as a database migration.
+class Show(db.Model):
+    __tablename__= 'shows'
+    __table_args__ = (
+        db.Index('ix_shows_artist_id_start_time', 'artist_id', 'start_time'),
+        db.Index('ix_shows_start_time', 'start_time'),
+        # venue calendars and booking checks
+        db.Index('ix_shows_venue_id_start_time', 'venue_id', 'start_time'),
+        db.CheckConstraint('duration_minutes BETWEEN 0 AND {0}'.format(MAX_SHOW_MINUTES), name='shows_ck_duration_minutes'),
+        # one partition per month, managed by `flask partitions`
+        {'postgresql_partition_by': 'RANGE (start_time)'},
+    )
+    venue_id=db.Column(db.Integer, db.ForeignKey('venue.id',ondelete='CASCADE'), primary_key=True, nullable=False)
+    artist_id=db.Column(db.Integer, db.ForeignKey('artist.id',ondelete='CASCADE'), primary_key=True, nullable=False)
+    start_time=db.Column(db.DateTime, primary_key=True, nullable= False)
+    # Overlapping bookings of a venue or an artist are rejected by exclusion
+    # constraints on each partition (see shows_ensure_partition()).
+    duration_minutes=db.Column(db.Integer, nullable=False, default=DEFAULT_SHOW_MINUTES, server_default=str(DEFAULT_SHOW_MINUTES))
+    updated_at=db.Column(db.DateTime, nullable=False, default=datetime.utcnow, onupdate=datetime.utcnow, server_default=db.text("(now() at time zone 'utc')"))
+
+#----------------------------------------------------------------------------#
+# Bookings.
+#----------------------------------------------------------------------------#
+
+def show_end(start_time, duration_minutes):
+  return start_time + timedelta(minutes=duration_minutes)
+
+def conflicting_shows(venue_id, artist_id, start_time, end_time):
+  # Shows of the venue or the artist overlapping [start_time, end_time). A
+  # show starting up to MAX_SHOW_MINUTES earlier may still be running.
+  rows = db.session.query(Show.venue_id, Show.artist_id, Show.start_time, Show.duration_minutes).filter(
+    db.or_(Show.venue_id == venue_id, Show.artist_id == artist_id),
+    Show.start_time > start_time - timedelta(minutes=MAX_SHOW_MINUTES),
+    Show.start_time < end_time)
+  return [row for row in rows if show_end(row.start_time, row.duration_minutes) > start_time]
+
+#----------------------------------------------------------------------------#
+# Show counters.
+#----------------------------------------------------------------------------#
+
+def count_new_show(venue_id, artist_id, start_time, currentTime):
+  # Add a just-inserted show to its venue's and artist's counters, in the
+  # caller's transaction.
+  column = 'upcoming_shows_count' if start_time > currentTime else 'past_shows_count'
+  for model, entity_id in ((Venue, venue_id), (Artist, artist_id)):
+    model.query.filter(model.id == entity_id).update(
+      {column: getattr(model, column) + 1}, synchronize_session=False)
+
+def counted_shows(model, show_fk, currentTime):
+  # Correlated (upcoming, past) COUNT subqueries for each row of `model`.
+  upcoming = db.select([db.func.count()]).where(
+    db.and_(show_fk == model.id, Show.start_time > currentTime)).as_scalar()
+  past = db.select([db.func.count()]).where(
+    db.and_(show_fk == model.id, Show.start_time <= currentTime)).as_scalar()
+  return upcoming, past
+
+def refresh_show_counters(model, show_fk, currentTime, ids=None):
+  # Recompute the counters of `model` rows from shows; all rows when `ids` is
+  # None, otherwise only those whose id is in `ids` (a list or a subquery).
+  upcoming, past = counted_shows(model, show_fk, currentTime)
+  query = model.query
+  if ids is not None:
+    query = query.filter(model.id.in_(ids))
+  return query.update({
+    model.upcoming_shows_count: upcoming,
+    model.past_shows_count: past,
+  }, synchronize_session=False)
+
+def stale_show_counters(model, show_fk, currentTime):
+  # Number of `model` rows whose stored counters disagree with shows.
+  upcoming, past = counted_shows(model, show_fk, currentTime)
+  return model.query.filter(db.or_(
+    model.upcoming_shows_count != upcoming,
+    model.past_shows_count != past)).count()
+
+def roll_past_shows(since, currentTime):
+  # Move shows that started in (since, currentTime] from the upcoming to the
+  # past counters. Recomputing from shows keeps this idempotent, so runs with
+  # overlapping windows are harmless.
+  window = db.and_(Show.start_time > since, Show.start_time <= currentTime)
+  venues = refresh_show_counters(Venue, Show.venue_id, currentTime,
+    db.session.query(Show.venue_id).filter(window).distinct())
+  artists = refresh_show_counters(Artist, Show.artist_id, currentTime,
+    db.session.query(Show.artist_id).filter(window).distinct())
+  return venues, artists
+
+def touch_show_partners(model, show_fk, partner_fk, entity_ids):
+  # Mark the `model` rows that share a show with any of `entity_ids` as
+  # updated, since their pages render those entities' names.
+  partners = db.session.query(show_fk).filter(partner_fk.in_(entity_ids))
+  return model.query.filter(model.id.in_(partners)).update(
+    {model.updated_at: datetime.utcnow()}, synchronize_session=False)
+
+#----------------------------------------------------------------------------#
+# Writes.
+#----------------------------------------------------------------------------#
+
+def update_entities(model, rows):
+  # Apply each {'id': ..., column: value, ...} in `rows` without loading the
+  # rows first: one UPDATE ... FROM (VALUES ...) RETURNING per distinct set
+  # of columns, setting only those. Returns (id, name, upcoming_shows_count)
+  # of every row that matched.
+  table = model.__table__
+  groups = {}
+  for row in rows:
+    groups.setdefault(tuple(sorted(key for key in row if key != 'id')), []).append(row)
+  updated = []
+  for columns, group in groups.items():
+    names = ('id',) + columns
+    source = db.values(*[db.column(name, table.c[name].type) for name in names], name='source').data(
+      [tuple(row[name] for name in names) for row in group])
+    # psycopg2 sends e.g. [] as an untyped '{}', which a VALUES list
+    # resolves as text; cast every value back to its column's type
+    statement = table.update().where(table.c.id == source.c.id).values(
+      dict((name, db.cast(source.c[name], table.c[name].type)) for name in columns)).returning(table.c.id, table.c.name, table.c.upcoming_shows_count)
+    updated.extend(db.session.execute(statement).fetchall())
+  return updated
+
+def delete_entities(model, entity_ids):
+  # DELETE ... RETURNING id; their shows go too (ON DELETE CASCADE).
+  table = model.__table__
+  return [row.id for row in db.session.execute(
+    table.delete().where(table.c.id.in_(entity_ids)).returning(table.c.id))]
@@ -0,0 +1,82 @@
+#----------------------------------------------------------------------------#
+# Read-replica routing.
+#
+# When SQLALCHEMY_BINDS has a 'replica' engine, views wrapped in
+# @replica.reads run their queries there; everything else, and any flush,
+# stays on the primary. A request that writes, by a flush or by an
+# INSERT/UPDATE/DELETE statement, marks the client's session so its reads go
+# to the primary for READ_YOUR_WRITES_SECONDS, long enough for the replica to
+# replay the change.
+#----------------------------------------------------------------------------#
+
+import time
+from functools import wraps
+
+from flask import current_app, g, session, has_app_context
+from flask_sqlalchemy import SQLAlchemy, SignallingSession
+from sqlalchemy import event, orm
+
+
+class RoutingSession(SignallingSession):
+
+  def get_bind(self, mapper=None, clause=None):
+    if not self._flushing and has_app_context() and g.get('read_replica'):
+      return self.app.extensions['sqlalchemy'].db.get_engine(self.app, bind='replica')
+    return SignallingSession.get_bind(self, mapper, clause)
+
+
+class RoutingSQLAlchemy(SQLAlchemy):
+
+  def create_session(self, options):
+    return orm.sessionmaker(class_=RoutingSession, db=self, **options)
+
+
+@event.listens_for(RoutingSession, 'after_flush')
+def _record_write(db_session, flush_context):
+  if has_app_context():
+    g.db_wrote = True
+
+
+@event.listens_for(RoutingSession, 'do_orm_execute')
+def _record_statement_write(orm_execute_state):
+  # INSERT/UPDATE/DELETE run through session.execute() or query.update()
+  # never flush
+  if has_app_context() and (orm_execute_state.is_insert or orm_execute_state.is_update
+                            or orm_execute_state.is_delete):
+    g.db_wrote = True
+
+
+class ReadReplica(object):
+
+  def __init__(self, app=None):
+    if app is not None:
+      self.init_app(app)
+
+  def init_app(self, app):
+    app.config.setdefault('READ_YOUR_WRITES_SECONDS', 10)
+    # A page rendered from a lagging replica can be cached under a version
+    # bumped by the write it hasn't seen yet; keep such entries short-lived.
+    app.config.setdefault('REPLICA_CACHE_TTL', 30)
+    app.after_request(self._remember_write)
+    app.extensions['read_replica'] = self
+
+  def enabled(self):
+    return 'replica' in (current_app.config.get('SQLALCHEMY_BINDS') or {})
+
+  def _remember_write(self, response):
+    if g.get('db_wrote'):
+      session['read_primary_until'] = time.time() + current_app.config['READ_YOUR_WRITES_SECONDS']
+    return response
+
+  def reads(self, view):
+    # Route a read-only view to the replica, unless this client wrote recently.
+    @wraps(view)
+    def wrapper(**kwargs):
+      if self.enabled() and session.get('read_primary_until', 0) < time.time():
+        g.read_replica = True
+        g.cache_ttl = min(current_app.config['CACHE_TTL'], current_app.config['REPLICA_CACHE_TTL'])
+      return view(**kwargs)
+    return wrapper
+
+
+replica = ReadReplica()
@@ -2,3 +2,35 @@ window.parseISOString = function parseISOString(s) {
   var b = s.split(/\D+/);
   return new Date(Date.UTC(b[0], --b[1], b[2], b[3], b[4], b[5], b[6]));
 };
+
+// Typeahead for search boxes marked data-autocomplete="venue|artist|any":
+// suggestions come from /autocomplete and fill the input's <datalist>.
+document.addEventListener('DOMContentLoaded', function () {
+  var inputs = document.querySelectorAll('input[data-autocomplete]');
+  Array.prototype.forEach.call(inputs, function (input, n) {
+    var list = document.createElement('datalist');
+    var timer = null;
+    list.id = 'autocomplete-' + n;
+    input.setAttribute('list', list.id);
+    input.setAttribute('autocomplete', 'off');
+    input.parentNode.appendChild(list);
+    input.addEventListener('input', function () {
+      clearTimeout(timer);
+      timer = setTimeout(function () {
+        if (!input.value.trim()) { list.innerHTML = ''; return; }
+        fetch('/autocomplete?q=' + encodeURIComponent(input.value))
+          .then(function (response) { return response.json(); })
+          .then(function (body) {
+            var kind = input.dataset.autocomplete;
+            list.innerHTML = '';
+            body.results.forEach(function (hit) {
+              if (kind !== 'any' && hit.kind !== kind) { return; }
+              var option = document.createElement('option');
+              option.value = hit.name;
+              list.appendChild(option);
+            });
+          });
+      }, 100);
+    });
+  });
+});
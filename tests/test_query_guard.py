@@ -0,0 +1,78 @@
+import logging
+
+import pytest
+
+import config
+from app import create_app
+from models import db
+from instrumentation import metrics, statement_shape, NPlusOneError, QueryBudgetExceeded
+
+
+@pytest.fixture
+def app():
+  app = create_app({
+    'TESTING': True,
+    'SECRET_KEY': 'test',
+    'SQLALCHEMY_DATABASE_URI': 'sqlite://',
+    'SQLALCHEMY_ENGINE_OPTIONS': {},
+    'QUERY_BUDGETS': {'probe': 2},
+  })
+
+  # issues `distinct` different statements, then `repeats` copies of one more
+  @app.route('/_probe/<int:distinct>/<int:repeats>', endpoint='probe')
+  def probe(distinct, repeats):
+    for number in range(distinct):
+      db.session.execute(db.text('SELECT 1 AS column_{0}'.format('abcdefgh'[number])))
+    for _ in range(repeats):
+      db.session.execute(db.text('SELECT 1 AS repeated'))
+    return 'ok'
+
+  return app
+
+
+def test_statement_shape_ignores_values_and_list_lengths():
+  assert statement_shape('SELECT *\n  FROM venue WHERE id IN (?, ?, ?)') == \
+    statement_shape('SELECT * FROM venue WHERE id IN (?)') == 'SELECT * FROM venue WHERE id IN (?)'
+  assert statement_shape('SELECT * FROM shows WHERE venue_id = %(venue_id_1)s LIMIT 10') == \
+    'SELECT * FROM shows WHERE venue_id = %(venue_id_1)s LIMIT ?'
+  assert statement_shape('SELECT * FROM venue WHERE id = 12') == statement_shape('SELECT * FROM venue WHERE id = 7')
+  assert statement_shape('SELECT * FROM venue') != statement_shape('SELECT * FROM artist')
+
+
+def test_guard_raises_on_repeated_statement(app):
+  app.config['QUERY_GUARD'] = 'raise'
+  with pytest.raises(NPlusOneError):
+    metrics._guard(app, 'GET', 'probe', ['SELECT * FROM venue WHERE id = %(id)s'] * 3)
+
+
+def test_guard_warns_instead_of_raising(app, caplog):
+  app.config['QUERY_GUARD'] = 'warn'
+  with caplog.at_level(logging.WARNING):
+    metrics._guard(app, 'GET', 'probe', ['SELECT * FROM venue WHERE id = %(id)s'] * 3 + ['SELECT 1'])
+  assert 'likely N+1' in caplog.text
+  assert 'budget is 2' in caplog.text
+
+
+def test_guard_is_raise_under_testing(app):
+  assert app.config['QUERY_GUARD'] == 'raise'
+
+
+def test_request_within_budget_passes(app):
+  response = app.test_client().get('/_probe/2/0')
+  assert response.status_code == 200
+
+
+def test_request_over_budget_raises(app):
+  with pytest.raises(QueryBudgetExceeded):
+    app.test_client().get('/_probe/3/0')
+
+
+def test_request_repeating_a_statement_raises(app):
+  app.config['QUERY_BUDGETS'] = {}
+  with pytest.raises(NPlusOneError):
+    app.test_client().get('/_probe/0/3')
+
+
+def test_every_budget_names_a_route(app):
+  endpoints = set(rule.endpoint for rule in app.url_map.iter_rules())
+  assert set(config.QUERY_BUDGETS) - endpoints == set()
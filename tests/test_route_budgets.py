@@ -0,0 +1,97 @@
+import os
+import random
+from datetime import datetime
+
+import pytest
+from flask_migrate import upgrade
+from sqlalchemy.dialects.postgresql import insert
+
+import config
+from app import create_app
+from autocomplete import autocomplete
+from models import db, Venue, Artist, Show, refresh_show_counters
+from benchmarks import seed
+from benchmarks.run import ROUTES, WRITE_ROUTES
+
+
+# A scratch Postgres database; its schema is dropped and migrated from scratch,
+# so never point this at one holding data you want. The migrations need the
+# pg_trgm and btree_gist extensions.
+DATABASE_URL = os.environ.get('TEST_DATABASE_URL')
+MIGRATIONS = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'migrations')
+
+# requests per route; the write routes build on each other's rows, in order
+REQUESTS = 3
+
+
+@pytest.fixture(scope='module')
+def app():
+  if not DATABASE_URL:
+    pytest.skip('set TEST_DATABASE_URL to a scratch Postgres database to check the routes')
+  app = create_app({
+    'TESTING': True,
+    'SECRET_KEY': 'test',
+    'SQLALCHEMY_DATABASE_URI': DATABASE_URL,
+    'SQLALCHEMY_BINDS': {},
+    'WTF_CSRF_ENABLED': False,
+    # every request reaches the database, so the guard sees its queries
+    'CACHE_ENABLED': False,
+  })
+  with app.app_context():
+    db.session.execute(db.text('DROP SCHEMA IF EXISTS archive CASCADE'))
+    db.session.execute(db.text('DROP SCHEMA public CASCADE'))
+    db.session.execute(db.text('CREATE SCHEMA public'))
+    db.session.commit()
+    upgrade(directory=MIGRATIONS)
+
+    rng = random.Random(7)
+    seed.load(Venue.__table__.insert(), seed.venue_rows(rng, 20), 1000, 'venues')
+    seed.load(Artist.__table__.insert(), seed.artist_rows(rng, 40), 1000, 'artists')
+    venue_ids = [row.id for row in db.session.query(Venue.id).order_by(Venue.id)]
+    artist_ids = [row.id for row in db.session.query(Artist.id).order_by(Artist.id)]
+    load = insert(Show.__table__).on_conflict_do_nothing()
+    seed.load(load, seed.show_rows(rng, 300, venue_ids, artist_ids, 60, 60), 1000, 'shows')
+    currentTime = datetime.utcnow()
+    refresh_show_counters(Venue, Show.venue_id, currentTime)
+    refresh_show_counters(Artist, Show.artist_id, currentTime)
+    db.session.commit()
+    # as the gunicorn post_fork hook does, so typeahead requests hit a built index
+    autocomplete.build()
+    db.session.remove()
+  return app
+
+
+@pytest.fixture(scope='module')
+def ctx(app):
+  with app.app_context():
+    ctx = {
+      'rng': random.Random(7),
+      'term': 'the',
+      'venue_ids': [row.id for row in db.session.query(Venue.id)],
+      'artist_ids': [row.id for row in db.session.query(Artist.id)],
+    }
+    db.session.remove()
+  return ctx
+
+
+def test_every_budget_has_a_route():
+  assert set(config.QUERY_BUDGETS) - set(route.endpoint for route in ROUTES + WRITE_ROUTES) == set()
+
+
+# QUERY_GUARD is 'raise' under TESTING, so a route over its QUERY_BUDGETS entry
+# or repeating a statement QUERY_REPEAT_LIMIT times fails here
+@pytest.mark.parametrize('route', ROUTES + WRITE_ROUTES, ids=lambda route: route.name)
+def test_route_stays_within_its_budget(app, ctx, route):
+  client = app.test_client()
+  for serial in range(REQUESTS):
+    ctx['serial'] = serial
+    with app.app_context():
+      url = route.url(ctx)
+      body = {'data': route.data(ctx), 'json': route.json(ctx)}
+      db.session.remove()
+    response = client.open(url, method=route.method, **dict((key, value) for key, value in body.items() if value is not None))
+    # streamed bodies run their queries while they are read, and are checked
+    # once closed
+    response.get_data()
+    response.close()
+    assert response.status_code < 400, '{0} returned {1}'.format(url, response.status_code)
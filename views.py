@@ -0,0 +1,984 @@
+#----------------------------------------------------------------------------#
+# Imports
+#----------------------------------------------------------------------------#
+
+import csv
+import io
+import json
+import dateutil.parser
+import babel
+import babel.dates
+from flask import Blueprint, render_template, stream_template, request, flash, redirect, url_for, abort, current_app, stream_with_context, jsonify, session
+from forms import *
+from models import db, Venue, Artist, Show, count_new_show, refresh_show_counters, touch_show_partners, \
+  conflicting_shows, show_end, update_entities, delete_entities, DEFAULT_SHOW_MINUTES, MAX_SHOW_MINUTES
+from cache import cache
+from replica import replica
+from autocomplete import autocomplete
+from bookings import bookings, free_slots
+from conditional import conditional
+from datetime import datetime, timedelta
+from itertools import groupby
+from collections import namedtuple
+from functools import lru_cache
+
+bp = Blueprint('main', __name__)
+
+#----------------------------------------------------------------------------#
+# Filters.
+#----------------------------------------------------------------------------#
+
+DATETIME_FORMATS = {
+  'full': "EEEE MMMM, d, y 'at' h:mma",
+  'medium': "EE MM, dd, y h:mma",
+}
+
+@lru_cache(maxsize=64)
+def datetime_pattern(format):
+  # Babel patterns are compiled once per format name or raw pattern.
+  return babel.dates.parse_pattern(DATETIME_FORMATS.get(format, format))
+
+@lru_cache(maxsize=16)
+def datetime_locale(locale):
+  return babel.Locale.parse(locale or babel.dates.LC_TIME)
+
+@bp.app_template_filter('datetime')
+@lru_cache(maxsize=4096)
+def format_datetime(value, format='medium', locale=None):
+  # Accepts datetimes or strings; show tiles repeat the same start times
+  # across pages, so formatted output is memoised.
+  if isinstance(value, str):
+    value = dateutil.parser.parse(value)
+  return babel.dates.format_datetime(value, datetime_pattern(format), locale=datetime_locale(locale))
+
+#----------------------------------------------------------------------------#
+# Queries.
+#----------------------------------------------------------------------------#
+
+# Placeholder images for show tiles whose artist or venue has no image_link.
+DEFAULT_ARTIST_IMAGE = "https://images.unsplash.com/photo-1549213783-8284d0336c4f?ixlib=rb-1.2.1&ixid=eyJhcHBfaWQiOjEyMDd9&auto=format&fit=crop&w=300&q=80"
+DEFAULT_VENUE_IMAGE = "https://images.unsplash.com/photo-1543900694-133f37abaaa5?ixlib=rb-1.2.1&ixid=eyJhcHBfaWQiOjEyMDd9&auto=format&fit=crop&w=400&q=60"
+
+# Rows fetched per round trip by exports, and written per response chunk.
+EXPORT_CHUNK_ROWS = 1000
+EXPORT_COLUMNS = ('start_time', 'venue_id', 'venue_name', 'city', 'state', 'artist_id', 'artist_name')
+EXPORT_MIMETYPES = {'csv': 'text/csv', 'jsonl': 'application/x-ndjson'}
+
+# Columns the edit forms and the batch PATCH endpoints may set.
+EDITABLE_COLUMNS = {
+  Venue: ('name', 'city', 'state', 'address', 'phone', 'genres', 'image_link', 'facebook_link'),
+  Artist: ('name', 'city', 'state', 'phone', 'genres', 'image_link', 'facebook_link'),
+}
+# Rows per batch PATCH or DELETE request, all applied in one transaction.
+BATCH_MAX_ROWS = 1000
+
+def with_genre(query, model, genre):
+  # Keep `model` rows listing `genre`; genres @> ARRAY[genre] uses the GIN index.
+  if genre:
+    query = query.filter(model.genres.contains([genre]))
+  return query
+
+# Read models for the list pages: plain tuples filled straight from
+# column-only selects, so no ORM entities or per-row dicts are built.
+# Rows fetched per round trip when a list page streams its rows.
+LISTING_FETCH_ROWS = 500
+AreaListing = namedtuple('AreaListing', 'city state venues')
+VenueListing = namedtuple('VenueListing', 'id name num_upcoming_shows')
+ArtistListing = namedtuple('ArtistListing', 'id name')
+ShowListing = namedtuple('ShowListing', 'start_time venue_id artist_id venue_name artist_name artist_image_link')
+
+def stream_rows(statement, server_side=True):
+  # Rows of `statement`, queried only once the template starts iterating.
+  # With `server_side`, they're fetched LISTING_FETCH_ROWS at a time through
+  # a server-side cursor, so a long listing is never held whole.
+  if server_side:
+    statement = statement.execution_options(stream_results=True)
+  result = db.session.execute(statement)
+  for row in result.yield_per(LISTING_FETCH_ROWS) if server_side else result:
+    yield row
+
+def stream_models(read_model, statement, server_side=True):
+  return map(read_model._make, stream_rows(statement, server_side))
+
+def venue_areas_query(genre=None):
+  # (city, state) and then the VenueListing columns of every venue, with
+  # its stored upcoming show count, ordered so venues of the same area are
+  # adjacent for grouping.
+  query = db.select([
+      Venue.city,
+      Venue.state,
+      Venue.id,
+      Venue.name,
+      Venue.upcoming_shows_count.label('num_upcoming_shows')
+    ])
+  return with_genre(query, Venue, genre).order_by(Venue.state, Venue.city, Venue.name)
+
+def artists_query(genre=None):
+  return with_genre(db.select([Artist.id, Artist.name]), Artist, genre)
+
+def name_search_query(model, search_term):
+  # id, name and upcoming show count for every `model` whose name contains
+  # `search_term`; the pg_trgm GIN index on name serves the ILIKE.
+  pattern = '%{0}%'.format(search_term.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_'))
+  return db.session.query(
+      model.id,
+      model.name,
+      model.upcoming_shows_count.label('num_upcoming_shows')
+    ).filter(model.name.ilike(pattern, escape='\\')
+    ).order_by(model.name)
+
+def text_search_query(text):
+  # Venues and artists whose search_vector matches `text` (web-search syntax:
+  # quoted phrases, "or", -excluded), best ts_rank first. Each half is served
+  # by its table's GIN index.
+  tsquery = db.func.websearch_to_tsquery('english', text)
+  hits = []
+  for model, kind in ((Venue, 'venue'), (Artist, 'artist')):
+    hits.append(db.select([
+        db.literal(kind).label('kind'),
+        model.id,
+        model.name,
+        model.city,
+        model.state,
+        model.upcoming_shows_count.label('num_upcoming_shows'),
+        db.func.ts_rank(model.search_vector, tsquery).label('rank')
+      ]).where(model.search_vector.op('@@')(tsquery)))
+  results = db.union_all(*hits).subquery()
+  return db.session.query(results).order_by(results.c.rank.desc(), results.c.kind, results.c.id)
+
+def shows_page_query(currentTime, when=None, start=None, end=None, after=None, genre=None):
+  # The ShowListing columns, in (start_time, venue_id, artist_id) order so a
+  # page can resume strictly after the last key of the previous one.
+  query = db.select([
+      Show.start_time,
+      Show.venue_id,
+      Show.artist_id,
+      Venue.name.label('venue_name'),
+      Artist.name.label('artist_name'),
+      Artist.image_link.label('artist_image_link')
+    ]).join(Venue, Venue.id == Show.venue_id
+    ).join(Artist, Artist.id == Show.artist_id)
+  if when == 'upcoming':
+    query = query.filter(Show.start_time > currentTime)
+  elif when == 'past':
+    query = query.filter(Show.start_time < currentTime)
+  if start is not None:
+    query = query.filter(Show.start_time >= start)
+  if end is not None:
+    query = query.filter(Show.start_time < end)
+  if after is not None:
+    query = query.filter(db.tuple_(Show.start_time, Show.venue_id, Show.artist_id) > db.tuple_(*after))
+  # a show's genres are its artist's
+  query = with_genre(query, Artist, genre)
+  return query.order_by(Show.start_time, Show.venue_id, Show.artist_id)
+
+def venue_detail_query(venue_id):
+  # The venue's own columns repeated on each of its shows (or once, with NULL
+  # show columns, when it has none), so the whole page is one round trip.
+  return db.session.query(
+      Venue.id,
+      Venue.name,
+      Venue.genres,
+      Venue.address,
+      Venue.city,
+      Venue.state,
+      Venue.phone,
+      Venue.facebook_link,
+      Venue.image_link,
+      Show.start_time,
+      Artist.id.label('artist_id'),
+      Artist.name.label('artist_name'),
+      Artist.image_link.label('artist_image_link')
+    ).outerjoin(Show, Show.venue_id == Venue.id
+    ).outerjoin(Artist, Artist.id == Show.artist_id
+    ).filter(Venue.id == venue_id
+    ).order_by(Show.start_time)
+
+def artist_detail_query(artist_id):
+  # Same shape as venue_detail_query, from the artist side.
+  return db.session.query(
+      Artist.id,
+      Artist.name,
+      Artist.genres,
+      Artist.city,
+      Artist.state,
+      Artist.phone,
+      Artist.facebook_link,
+      Artist.image_link,
+      Show.start_time,
+      Venue.id.label('venue_id'),
+      Venue.name.label('venue_name'),
+      Venue.image_link.label('venue_image_link')
+    ).outerjoin(Show, Show.artist_id == Artist.id
+    ).outerjoin(Venue, Venue.id == Show.venue_id
+    ).filter(Artist.id == artist_id
+    ).order_by(Show.start_time)
+
+def shows_export_query(start=None, end=None, venue_id=None, artist_id=None, city=None):
+  # Every matching show with its venue and artist, fetched in chunks from a
+  # server-side cursor so an export never holds the whole result in memory.
+  query = db.session.query(
+      Show.start_time,
+      Show.venue_id,
+      Venue.name.label('venue_name'),
+      Venue.city,
+      Venue.state,
+      Show.artist_id,
+      Artist.name.label('artist_name')
+    ).join(Venue, Venue.id == Show.venue_id
+    ).join(Artist, Artist.id == Show.artist_id)
+  if start is not None:
+    query = query.filter(Show.start_time >= start)
+  if end is not None:
+    query = query.filter(Show.start_time < end)
+  if venue_id is not None:
+    query = query.filter(Show.venue_id == venue_id)
+  if artist_id is not None:
+    query = query.filter(Show.artist_id == artist_id)
+  if city is not None:
+    query = query.filter(Venue.city == city)
+  return query.order_by(Show.start_time, Show.venue_id, Show.artist_id).yield_per(EXPORT_CHUNK_ROWS)
+
+#  Validators for @conditional: (last_modified, etag_parts) from one cheap query.
+
+def entity_validator(model, entity_id):
+  updated_at = db.session.query(model.updated_at).filter(model.id == entity_id).scalar()
+  if updated_at is None:
+    abort(404)
+  return updated_at, [entity_id, updated_at]
+
+def venue_validator(venue_id):
+  return entity_validator(Venue, venue_id)
+
+def artist_validator(artist_id):
+  return entity_validator(Artist, artist_id)
+
+def listing_validator(model):
+  # No Last-Modified: a delete lowers the count without raising max(updated_at).
+  latest, total = db.session.query(db.func.max(model.updated_at), db.func.count(model.id)).one()
+  return None, [latest, total]
+
+def venues_validator():
+  return listing_validator(Venue)
+
+def artists_validator():
+  return listing_validator(Artist)
+
+def shows_validator():
+  columns = [
+    db.session.query(db.func.max(Show.updated_at)).as_scalar(),
+    db.session.query(db.func.count(Show.venue_id)).as_scalar(),
+    db.session.query(db.func.max(Venue.updated_at)).as_scalar(),
+    db.session.query(db.func.max(Artist.updated_at)).as_scalar(),
+  ]
+  if request.args.get('when'):
+    # the upcoming/past split moves whenever a show starts
+    columns.append(db.session.query(db.func.max(Show.start_time)).filter(Show.start_time <= datetime.utcnow()).as_scalar())
+  return None, list(db.session.query(*columns).one())
+
+#----------------------------------------------------------------------------#
+# Writes.
+#
+# Edits and deletes go straight to one UPDATE ... RETURNING or DELETE per
+# statement shape, without loading the rows first, then fix up whatever
+# renders them: partners' ETags, counters, cache scopes and the typeahead.
+#----------------------------------------------------------------------------#
+
+# model -> (kind, partner model, its show column, the model's show column)
+PARTNERS = {
+  Venue: ('venue', Artist, Show.artist_id, Show.venue_id),
+  Artist: ('artist', Venue, Show.venue_id, Show.artist_id),
+}
+
+def form_values(model):
+  # The submitted edit-form fields; genres is a multi-select, so it's
+  # missing, not empty, when none are picked.
+  values = dict((name, request.form.get(name)) for name in EDITABLE_COLUMNS[model] if name in request.form)
+  values['genres'] = request.form.getlist('genres')
+  return values
+
+def save_edits(model, rows):
+  # Commit `rows` (see update_entities); returns (updated rows, ids that
+  # matched no row), and rolls everything back if there are any of the latter.
+  kind, partner, partner_fk, show_fk = PARTNERS[model]
+  updated = update_entities(model, rows)
+  missing = sorted(set(row['id'] for row in rows) - set(row.id for row in updated))
+  if missing:
+    db.session.rollback()
+    return [], missing
+  renamed = sorted(row['id'] for row in rows if 'name' in row)
+  if renamed:
+    # partners' pages render the name
+    touch_show_partners(partner, partner_fk, show_fk, renamed)
+  db.session.commit()
+  cache.bump(kind + 's', *(([kind + '-names'] if renamed else []) +
+                           ['{0}:{1}'.format(kind, row.id) for row in updated]))
+  for row in updated:
+    autocomplete.add(kind, row.id, row.name, row.upcoming_shows_count)
+  return updated, missing
+
+def remove_entities(model, entity_ids):
+  # Delete `entity_ids` and their shows, recounting the partners those
+  # shows counted towards; returns the ids that matched no row, in which
+  # case nothing is deleted.
+  kind, partner, partner_fk, show_fk = PARTNERS[model]
+  partner_ids = [row[0] for row in db.session.query(partner_fk).filter(show_fk.in_(entity_ids)).distinct()]
+  deleted = delete_entities(model, entity_ids)
+  missing = sorted(set(entity_ids) - set(deleted))
+  if missing:
+    db.session.rollback()
+    return missing
+  if partner_ids:
+    refresh_show_counters(partner, partner_fk, datetime.utcnow(), partner_ids)
+  db.session.commit()
+  partner_kind = PARTNERS[partner][0]
+  cache.bump(kind + 's', kind + '-names', 'shows', partner_kind + 's', *(
+    ['{0}:{1}'.format(kind, entity_id) for entity_id in deleted] +
+    ['{0}:{1}'.format(partner_kind, partner_id) for partner_id in partner_ids]))
+  for entity_id in deleted:
+    autocomplete.remove(kind, entity_id)
+  return missing
+
+#----------------------------------------------------------------------------#
+# Rendering.
+#----------------------------------------------------------------------------#
+
+# layouts/main.html puts this just before the content block
+STREAM_FLUSH = '<!-- flush -->'
+
+def chunked(pieces, size):
+  # Join the many small strings a template yields into ~`size` chunks, and
+  # send the layout as soon as it's rendered, before the rows are queried.
+  buffer = []
+  buffered = 0
+  for piece in pieces:
+    buffer.append(piece)
+    buffered += len(piece)
+    if buffered >= size or piece.endswith(STREAM_FLUSH):
+      yield ''.join(buffer)
+      buffer = []
+      buffered = 0
+  if buffer:
+    yield ''.join(buffer)
+
+def render_listing(template, **context):
+  # Render a list page whose rows come from generators. Streamed, the
+  # layout goes out before the rows are fetched, and rows are rendered as
+  # the cursor yields them; with STREAM_TEMPLATES off the page is built
+  # whole, from the same generators. So is a page with pending flashes:
+  # the session cookie that drops them is written before a stream starts.
+  if not current_app.config['STREAM_TEMPLATES'] or session.get('_flashes'):
+    return render_template(template, **context)
+  return current_app.response_class(
+    chunked(stream_template(template, **context), current_app.config['STREAM_CHUNK_SIZE']), mimetype='text/html')
+
+#----------------------------------------------------------------------------#
+# Controllers.
+#----------------------------------------------------------------------------#
+
+@bp.route('/')
+def index():
+  return render_template('pages/home.html')
+
+
+#  Venues
+#  ----------------------------------------------------------------
+
+@bp.route('/venues')
+@replica.reads
+@conditional(venues_validator)
+@cache.cached('venues')
+def venues():
+  # Displays venues grouped by (city, state), with their stored upcoming show
+  # counts, optionally only those listing ?genre=.
+  rows = stream_rows(venue_areas_query(request.args.get('genre')))
+  # pages/venues.html renders each area's venues before asking for the next
+  areas = (AreaListing(city, state, (VenueListing._make(row[2:]) for row in group))
+           for (city, state), group in groupby(rows, key=lambda row: (row[0], row[1])))
+  return render_listing('pages/venues.html', areas=areas)
+
+@bp.route('/venues/search', methods=['POST'])
+@replica.reads
+def search_venues():
+  # seach for Hop should return "The Musical Hop".
+  # search for "Music" should return "The Musical Hop" and "Park Square Live Music & Coffee"
+  search_term=request.form.get('search_term', '')
+  def search():
+    rows= name_search_query(Venue, search_term).all()
+    return {
+      "count": len(rows),
+      "data": [{
+        "id":row.id,
+        "name":row.name,
+        "num_upcoming_shows":row.num_upcoming_shows
+      } for row in rows]
+    }
+  response= cache.fragment('search_venues', [search_term], ('venues',), search)
+  return render_template('pages/search_venues.html', results=response, search_term=search_term)
+
+#  Search
+#  ----------------------------------------------------------------
+
+@bp.route('/search')
+@replica.reads
+def search():
+  # ranked full-text search over venues and artists at /search?q=...&page=N
+  query = request.args.get('q', '').strip()
+  page = max(request.args.get('page', 1, type=int), 1)
+  per_page = current_app.config['SEARCH_PER_PAGE']
+  def results():
+    if not query:
+      return {"data": [], "has_next": False}
+    rows = text_search_query(query).offset((page - 1) * per_page).limit(per_page + 1).all()
+    return {
+      "data": [{
+        "kind": row.kind,
+        "id": row.id,
+        "name": row.name,
+        "city": row.city,
+        "state": row.state,
+        "num_upcoming_shows": row.num_upcoming_shows
+      } for row in rows[:per_page]],
+      "has_next": len(rows) > per_page
+    }
+  response = cache.fragment('search', [query, page], ('venues', 'artists'), results)
+  prev_url = url_for('.search', q=query, page=page - 1) if page > 1 else None
+  next_url = url_for('.search', q=query, page=page + 1) if response['has_next'] else None
+  return render_template('pages/search.html', query=query, results=response, prev_url=prev_url, next_url=next_url)
+
+@bp.route('/autocomplete')
+@replica.reads
+def autocomplete_names():
+  # typeahead for venue and artist names at /autocomplete?q=mus[&limit=N],
+  # served from the in-process prefix index, busiest first
+  limit = request.args.get('limit', current_app.config['AUTOCOMPLETE_LIMIT'], type=int)
+  hits = autocomplete.search(request.args.get('q', ''), max(limit, 1))
+  return jsonify({"results": [{
+    "kind": kind,
+    "id": entity_id,
+    "name": name,
+    "num_upcoming_shows": num_upcoming_shows,
+    "url": url_for('.show_' + kind, **{kind + '_id': entity_id})
+  } for kind, entity_id, name, num_upcoming_shows in hits]})
+
+@bp.route('/venues/<int:venue_id>')
+@replica.reads
+@conditional(venue_validator)
+@cache.cached('venue:{venue_id}', 'artist-names')
+def show_venue(venue_id):
+  # shows the venue page with the given venue_id
+  rows= venue_detail_query(venue_id).all()
+  if not rows:
+    abort(404)
+  venue= rows[0]
+  currentTime=datetime.utcnow()
+  past_shows=[]
+  upcoming_shows=[]
+  for row in rows:
+    if row.start_time is None:
+      continue
+    showObj={
+      "artist_id":row.artist_id,
+      "artist_name":row.artist_name,
+      "artist_image_link": row.artist_image_link or DEFAULT_ARTIST_IMAGE,
+      "start_time":row.start_time
+    }
+    (upcoming_shows if row.start_time > currentTime else past_shows).append(showObj)
+
+  data={
+    "id": venue.id,
+    "name": venue.name,
+    "genres": venue.genres,
+    "address": venue.address,
+    "city": venue.city,
+    "state": venue.state,
+    "phone": venue.phone,
+    "website": "https://www.dummyWebsite.com",
+    "facebook_link": venue.facebook_link,
+    # "seeking_talent": True,
+    # "seeking_description": "We are on the lookout for a local artist to play every two weeks. Please call us.",
+    "image_link": venue.image_link,
+    "past_shows":past_shows, 
+    "upcoming_shows": upcoming_shows,
+    "past_shows_count": len(past_shows),
+    "upcoming_shows_count": len(upcoming_shows),
+  }
+  return render_template('pages/show_venue.html', venue=data)
+
+@bp.route('/venues/<int:venue_id>/calendar')
+def venue_calendar(venue_id):
+  # busy and free slots of the venue over ?from=YYYY-MM-DD&to=YYYY-MM-DD
+  # (inclusive, today and the next 6 days by default), from the worker's
+  # interval index of its bookings; always read from the primary
+  today = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
+  start = parse_date_arg('from') or today
+  end = parse_date_arg('to') or start + timedelta(days=6)
+  end += timedelta(days=1)
+  # the worker indexes only that far ahead
+  if start < today or end <= start or end > today + timedelta(days=current_app.config['CALENDAR_MAX_DAYS']):
+    abort(400)
+  index = bookings.index(venue_id, today)
+  if index is None:
+    abort(404)
+  busy = index.overlapping(start, end)
+  return jsonify({
+    "venue_id": venue_id,
+    "from": start.isoformat(),
+    "to": end.isoformat(),
+    "busy": [{
+      "start": start_time.isoformat(),
+      "end": end_time.isoformat(),
+      "artist_id": artist_id
+    } for start_time, end_time, artist_id in busy],
+    "free": [{
+      "start": free_start.isoformat(),
+      "end": free_end.isoformat()
+    } for free_start, free_end in free_slots(busy, start, end)]
+  })
+
+#  Create Venue
+#  ----------------------------------------------------------------
+
+@bp.route('/venues/create', methods=['GET'])
+def create_venue_form():
+  form = VenueForm()
+  return render_template('forms/new_venue.html', form=form)
+
+@bp.route('/venues/create', methods=['POST'])
+def create_venue_submission():
+  try:
+    name=request.form.get('name','')
+    city = request.form.get('city')
+    state = request.form.get('state')
+    address = request.form.get('address')
+    phone = request.form.get('phone')
+    genres = request.form.getlist('genres')
+    facebook_link = request.form.get('facebook_link')
+    
+    venue = Venue(name=name,city=city, state=state, address=address,phone=phone,genres=genres, facebook_link=facebook_link)
+    db.session.add(venue)
+    db.session.flush()
+    venue_id = venue.id
+    db.session.commit()
+    cache.bump('venues')
+    autocomplete.add('venue', venue_id, name)
+    # on successful db insert, flash success
+    flash('Venue ' + request.form['name'] + ' was successfully listed!')
+  except:
+    # on unsuccessful db insert, flash an error instead.
+    flash('Venue ' + request.form['name'] + ' was not successfully listed! Error!')
+    db.session.rollback()
+    current_app.logger.exception('%s failed', request.endpoint)
+  finally:
+    db.session.close()
+  # e.g., flash('An error occurred. Venue ' + data.name + ' could not be listed.')
+  # see: http://flask.pocoo.org/docs/1.0/patterns/flashing/
+  return render_template('pages/home.html')
+
+@bp.route('/venues/<int:venue_id>', methods=['DELETE'])
+def delete_venue(venue_id):
+  # Take a venue_id and use SQLAlchemy ORM to delete a record. Handle cases where the session commit could fail.
+  missing=[]
+  try:
+    missing=remove_entities(Venue, [venue_id])
+  except:
+    db.session.rollback()
+    current_app.logger.exception('%s failed', request.endpoint)
+  finally:
+    db.session.close()
+  if missing:
+    abort(404)
+  return render_template('pages/home.html')
+  
+
+#  Artists
+#  ----------------------------------------------------------------
+@bp.route('/artists')
+@replica.reads
+@conditional(artists_validator)
+@cache.cached('artists')
+def artists():
+  artists = stream_models(ArtistListing, artists_query(request.args.get('genre')))
+  return render_listing('pages/artists.html', artists=artists)
+
+
+@bp.route('/artists/search', methods=['POST'])
+@replica.reads
+def search_artists():
+  # Implement's a search on artists with partial string search.
+  search_term=request.form.get('search_term', '')
+  def search():
+    rows= name_search_query(Artist, search_term).all()
+    return {
+      "count": len(rows),
+      "data": [{
+        "id":row.id,
+        "name":row.name,
+        "num_upcoming_shows":row.num_upcoming_shows
+      } for row in rows]
+    }
+  response= cache.fragment('search_artists', [search_term], ('artists',), search)
+  return render_template('pages/search_artists.html', results=response, search_term=search_term)
+
+@bp.route('/artists/<int:artist_id>')
+@replica.reads
+@conditional(artist_validator)
+@cache.cached('artist:{artist_id}', 'venue-names')
+def show_artist(artist_id):
+  # shows the artist page with the given artist_id
+  rows= artist_detail_query(artist_id).all()
+  if not rows:
+    abort(404)
+  artist= rows[0]
+  currentTime=datetime.utcnow()
+  past_shows=[]
+  upcoming_shows=[]
+  for row in rows:
+    if row.start_time is None:
+      continue
+    showObj={
+      "venue_id": row.venue_id,
+      "venue_name": row.venue_name,
+      "venue_image_link": row.venue_image_link or DEFAULT_VENUE_IMAGE,
+      "start_time": row.start_time
+    }
+    (upcoming_shows if row.start_time > currentTime else past_shows).append(showObj)
+
+  data={
+    "id": artist.id,
+    "name": artist.name,
+    "genres":artist.genres,
+    "city": artist.city,
+    "state": artist.state,
+    "phone": artist.phone,
+    "facebook_link": artist.facebook_link,
+    # "seeking_venue": True,
+    # "seeking_description": "Looking for shows to perform at in the San Francisco Bay Area!",
+    "image_link": artist.image_link,
+    "past_shows": past_shows,
+    "upcoming_shows": upcoming_shows,
+    "past_shows_count": len(past_shows),
+    "upcoming_shows_count": len(upcoming_shows),
+  }
+  
+  return render_template('pages/show_artist.html', artist=data)
+
+#  Update
+#  ----------------------------------------------------------------
+@bp.route('/artists/<int:artist_id>/edit', methods=['GET'])
+def edit_artist(artist_id):
+  form = ArtistForm()
+  artists=Artist.query.filter_by(id=artist_id).first()
+  artist={
+    "id": artists.id,
+    "name": artists.name,
+    "genres": artists.genres,
+    "city": artists.city,
+    "state": artists.state,
+    "phone": artists.phone,
+    "facebook_link": artists.facebook_link,
+    # "seeking_venue": True,
+    # "seeking_description": "Looking for shows to perform at in the San Francisco Bay Area!",
+    "image_link": artists.image_link
+  }
+  return render_template('forms/edit_artist.html', form=form, artist=artist)
+
+@bp.route('/artists/<int:artist_id>/edit', methods=['POST'])
+def edit_artist_submission(artist_id):
+  # Take values from the form submitted, and update existing
+  # artist record with ID <artist_id> using the new attributes
+  missing=[]
+  try:
+    _, missing=save_edits(Artist, [dict(form_values(Artist), id=artist_id)])
+  except:
+    db.session.rollback()
+    flash('Artist ' + request.form['name'] + ' was not successfully updated! Error!')
+    current_app.logger.exception('%s failed', request.endpoint)
+  finally:
+    db.session.close()
+  if missing:
+    abort(404)
+  return redirect(url_for('.show_artist', artist_id=artist_id))
+
+@bp.route('/venues/<int:venue_id>/edit', methods=['GET'])
+def edit_venue(venue_id):
+  form = VenueForm()
+  venues = Venue.query.filter_by(id=venue_id).first()
+  venue={
+    "id": venues.id,
+    "name": venues.name,
+    "genres": venues.genres,
+    "address": venues.address,
+    "city": venues.city,
+    "state": venues.state,
+    "phone": venues.phone,
+    "facebook_link": venues.facebook_link,
+    # "seeking_talent": True,
+    # "seeking_description": "We are on the lookout for a local artist to play every two weeks. Please call us.",
+    "image_link": venues.image_link
+  }
+  return render_template('forms/edit_venue.html', form=form, venue=venue)
+
+@bp.route('/venues/<int:venue_id>/edit', methods=['POST'])
+def edit_venue_submission(venue_id):
+  # Take values from the form submitted, and update existing
+  # venue record with ID <venue_id> using the new attributes
+  missing=[]
+  try:
+    _, missing=save_edits(Venue, [dict(form_values(Venue), id=venue_id)])
+  except:
+    db.session.rollback()
+    flash('Venue ' + request.form['name'] + ' was not successfully updated! Error!')
+    current_app.logger.exception('%s failed', request.endpoint)
+  finally:
+    db.session.close()
+  if missing:
+    abort(404)
+  return redirect(url_for('.show_venue', venue_id=venue_id))
+
+#  Batch edits
+#  ----------------------------------------------------------------
+
+def batch_payload():
+  payload = request.get_json(silent=True)
+  if not isinstance(payload, list) or not 0 < len(payload) <= BATCH_MAX_ROWS:
+    abort(400)
+  return payload
+
+def valid_edit(model, row):
+  if not isinstance(row, dict) or type(row.get('id')) is not int or len(row) < 2:
+    return False
+  for name, value in row.items():
+    if name == 'genres':
+      if not isinstance(value, list) or not all(isinstance(genre, str) for genre in value):
+        return False
+    elif name != 'id' and (name not in EDITABLE_COLUMNS[model] or not isinstance(value, (str, type(None)))):
+      return False
+  return True
+
+def edit_batch(model):
+  # PATCH body: [{"id": 1, "name": "..."}, ...]; each row sets only the
+  # columns it names. 404 with the unknown ids, and nothing saved, if any
+  # id matches no row.
+  rows = batch_payload()
+  if not all(valid_edit(model, row) for row in rows) or len(set(row['id'] for row in rows)) < len(rows):
+    abort(400)
+  updated, missing = save_edits(model, rows)
+  if missing:
+    return jsonify({"missing": missing}), 404
+  return jsonify({"updated": [{
+    "id": row.id,
+    "name": row.name,
+    "num_upcoming_shows": row.upcoming_shows_count
+  } for row in updated]})
+
+def delete_batch(model):
+  # DELETE body: [1, 2, ...]; 404 with the unknown ids, and nothing
+  # deleted, if any id matches no row.
+  entity_ids = batch_payload()
+  if not all(type(entity_id) is int for entity_id in entity_ids):
+    abort(400)
+  missing = remove_entities(model, sorted(set(entity_ids)))
+  if missing:
+    return jsonify({"missing": missing}), 404
+  return jsonify({"deleted": sorted(set(entity_ids))})
+
+@bp.route('/venues', methods=['PATCH'])
+def edit_venues():
+  return edit_batch(Venue)
+
+@bp.route('/venues', methods=['DELETE'])
+def delete_venues():
+  return delete_batch(Venue)
+
+@bp.route('/artists', methods=['PATCH'])
+def edit_artists():
+  return edit_batch(Artist)
+
+@bp.route('/artists', methods=['DELETE'])
+def delete_artists():
+  return delete_batch(Artist)
+
+#  Create Artist
+#  ----------------------------------------------------------------
+
+@bp.route('/artists/create', methods=['GET'])
+def create_artist_form():
+  form = ArtistForm()
+  return render_template('forms/new_artist.html', form=form)
+
+@bp.route('/artists/create', methods=['POST'])
+def create_artist_submission():
+  # called upon submitting the new artist listing form
+  try:
+    name=request.form.get('name','')
+    city = request.form.get('city')
+    state = request.form.get('state')
+    phone = request.form.get('phone')
+    genres = request.form.getlist('genres')
+    facebook_link = request.form.get('facebook_link')
+    
+    artist = Artist(name=name,city=city, state=state,phone=phone,genres=genres, facebook_link=facebook_link)
+    db.session.add(artist)
+    db.session.flush()
+    artist_id = artist.id
+    db.session.commit()
+    cache.bump('artists')
+    autocomplete.add('artist', artist_id, name)
+    flash('Artist ' + request.form['name'] + ' was successfully listed!')
+  except:
+    flash('Artist ' + request.form['name'] + ' was not successfully listed! Error!')
+    db.session.rollback()
+    current_app.logger.exception('%s failed', request.endpoint)
+  finally:
+    db.session.close()
+  return render_template('pages/home.html')
+
+
+#  Shows
+#  ----------------------------------------------------------------
+
+def encode_show_cursor(row):
+  return '{0}_{1}_{2}'.format(row.start_time.isoformat(), row.venue_id, row.artist_id)
+
+def decode_show_cursor(cursor):
+  start_time, venue_id, artist_id = cursor.split('_')
+  return datetime.fromisoformat(start_time), int(venue_id), int(artist_id)
+
+def parse_date_arg(name):
+  value = request.args.get(name)
+  if not value:
+    return None
+  try:
+    return datetime.strptime(value, '%Y-%m-%d')
+  except ValueError:
+    abort(400)
+
+def parse_int_arg(name):
+  value = request.args.get(name)
+  if not value:
+    return None
+  try:
+    return int(value)
+  except ValueError:
+    abort(400)
+
+@bp.route('/shows')
+@replica.reads
+@conditional(shows_validator)
+@cache.cached('shows', 'venue-names', 'artist-names')
+def shows():
+  # displays one page of shows at /shows, optionally filtered by
+  # ?when=upcoming|past, an inclusive ?from=YYYY-MM-DD&to=YYYY-MM-DD range
+  # and the artist's ?genre=
+  when = request.args.get('when')
+  if when not in (None, 'upcoming', 'past'):
+    abort(400)
+  start = parse_date_arg('from')
+  end = parse_date_arg('to')
+  if end is not None:
+    end += timedelta(days=1)
+  after = None
+  if request.args.get('after'):
+    try:
+      after = decode_show_cursor(request.args['after'])
+    except ValueError:
+      abort(400)
+  per_page = current_app.config['SHOWS_PER_PAGE']
+
+  rows = stream_models(ShowListing, shows_page_query(
+    datetime.utcnow(), when, start, end, after, request.args.get('genre')).limit(per_page + 1), server_side=False)
+  # the extra row only tells whether there is a next page; the template
+  # reads pager.next_url after it has rendered the rows
+  pager = {}
+  def page():
+    for count, row in enumerate(rows):
+      if count == per_page:
+        args = request.args.to_dict()
+        args['after'] = encode_show_cursor(last)
+        pager['next_url'] = url_for('.shows', **args)
+        break
+      last = row
+      yield row
+  return render_listing('pages/shows.html', shows=page(), pager=pager)
+
+def export_lines(rows, format):
+  # Yield the CSV (with a header) or JSONL text of `rows`, EXPORT_CHUNK_ROWS at a time.
+  buffer = io.StringIO()
+  writer = csv.writer(buffer)
+  if format == 'csv':
+    writer.writerow(EXPORT_COLUMNS)
+  for count, row in enumerate(rows, 1):
+    if format == 'csv':
+      writer.writerow([row.start_time.isoformat()] + list(row[1:]))
+    else:
+      buffer.write(json.dumps(dict(zip(EXPORT_COLUMNS, [row.start_time.isoformat()] + list(row[1:])))))
+      buffer.write('\n')
+    if count % EXPORT_CHUNK_ROWS == 0:
+      yield buffer.getvalue()
+      buffer.seek(0)
+      buffer.truncate()
+  yield buffer.getvalue()
+
+@bp.route('/shows/export.<any(csv, jsonl):format>')
+@replica.reads
+def export_shows(format):
+  # streams every show matching ?from=&to= (inclusive dates), ?venue_id=,
+  # ?artist_id= and ?city= as CSV or JSON lines
+  start = parse_date_arg('from')
+  end = parse_date_arg('to')
+  if end is not None:
+    end += timedelta(days=1)
+  query = shows_export_query(start, end, parse_int_arg('venue_id'), parse_int_arg('artist_id'),
+                             request.args.get('city'))
+  response = current_app.response_class(
+    stream_with_context(export_lines(query, format)), mimetype=EXPORT_MIMETYPES[format])
+  response.headers['Content-Disposition'] = 'attachment; filename=shows.{0}'.format(format)
+  return response
+
+@bp.route('/shows/create')
+def create_shows():
+  # renders form. do not touch.
+  form = ShowForm()
+  return render_template('forms/new_show.html', form=form)
+
+@bp.route('/shows/create', methods=['POST'])
+def create_show_submission():
+  # called to create new shows in the db, upon submitting new show listing form
+  try:  
+    artist_id = request.form.get('artist_id', type=int)
+    venue_id= request.form.get('venue_id', type=int)
+    start_time = dateutil.parser.parse(request.form.get('start_time'))
+    duration_minutes = request.form.get('duration_minutes', DEFAULT_SHOW_MINUTES, type=int)
+    if not 0 < duration_minutes <= MAX_SHOW_MINUTES:
+      raise ValueError('duration_minutes out of range')
+    # Lock both rows so concurrent bookings of this venue or artist queue
+    # up behind this check; the per-partition exclusion constraints can't
+    # see a clash with a show that started in the previous month.
+    db.session.query(Venue.id, Artist.id).join(Artist, Artist.id == artist_id).filter(Venue.id == venue_id).with_for_update().one()
+    if conflicting_shows(venue_id, artist_id, start_time, show_end(start_time, duration_minutes)):
+      flash('Show was not listed: the venue or the artist is already booked at that time.')
+      db.session.rollback()
+      return render_template('pages/home.html')
+    show = Show(artist_id=artist_id,venue_id=venue_id, start_time=start_time, duration_minutes=duration_minutes)
+    db.session.add(show)
+    db.session.flush()
+    count_new_show(show.venue_id, show.artist_id, start_time, datetime.utcnow())
+    db.session.commit()
+    cache.bump('shows', 'venues', 'artists', 'venue:{0}'.format(venue_id), 'artist:{0}'.format(artist_id))
+    flash('Show was successfully listed!')
+  except:
+    flash('Show was not successfully listed!')
+    db.session.rollback()
+    current_app.logger.exception('%s failed', request.endpoint)
+  finally:
+    db.session.close()
+  return render_template('pages/home.html')
+
+@bp.app_errorhandler(404)
+def not_found_error(error):
+    return render_template('errors/404.html'), 404
+
+@bp.app_errorhandler(500)
+def server_error(error):
+    return render_template('errors/500.html'), 500